@@ -12,9 +12,14 @@ from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
 import os
 from api.v1.caching.cache import Cache
+from api.v1.utils import compression
+from api.v1.utils.json_provider import OrjsonProvider, orjson
 
 
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+compression.init_app(app)
 CORS(app, resources={
     r"/api/v1/*": {
         "origins": ["http://localhost:5173"],
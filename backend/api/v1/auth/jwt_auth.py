@@ -18,6 +18,8 @@ class JWTAuth(Auth):
         :param token_expires_in_minutes: Token expiration time in minutes
         """
         self.cache = Cache()
+        self._user_id = self.cache.cached(
+            "user_id:email:{email}", tags=("users",))(self._find_user_id)
         self.jwt = None
         self.secret_key = secret_key
         self.token_expires_in_minutes = token_expires_in_minutes
@@ -55,28 +57,28 @@ class JWTAuth(Auth):
             if current_user_email is None:
                 return None
             
-            key = f"user:{current_user_email}"
-            cached_user = self.cache.get_cache(key)
-            if cached_user:
-                return cached_user
-
-            dictt = {"email": current_user_email}
-            user_exist = storage.search(User, dictt)
-
-            if not user_exist:
+            # only the email -> id lookup is cached, callers need a User
+            user_id = self._user_id(email=current_user_email)
+            if user_id is None:
                 return None
 
-            user_instance = user_exist[0]
-            
-
-            self.cache.set_cache(current_user_email, user_instance.to_dict())
-            
-            return user_instance
+            return storage.get(User, user_id)
 
         except Exception as e:
             print(f"Error in current_user: {e}")
             return None
     
+    @staticmethod
+    def _find_user_id(email):
+        """
+        Look up the id of the user with the given email.
+
+        :param email: The email in the token identity
+        :return: The user id or None
+        """
+        users = storage.search(User, {"email": email}, limit=1)
+        return users[0].id if users else None
+
     def jwt_required_decorator(self, func):
         """
         Wrapper for @jwt_required decorator to protect a route.
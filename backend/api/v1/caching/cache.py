@@ -1,21 +1,175 @@
-import redis
-import json
-from datetime import datetime
+import functools
+import inspect
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from api.v1.caching.connection import get_blocking_redis, get_redis
+from api.v1.caching.serializers import Codec, SerializationError
+
+
+class LocalCache:
+    """Bounded in-process LRU with per-entry TTL and memory accounting.
+
+    Entry sizes are the length of their serialized form, which is what a
+    Redis round-trip would have transferred.
+
+    generation counts the deletes and clears. A caller reading Redis
+    passes the generation it saw before the read to set(), which drops
+    the fill if an invalidation came in meanwhile: the value read may be
+    older than the write that invalidation announced.
+    """
+
+    def __init__(self, max_bytes: int, ttl: int):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.evictions = 0
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """
+        Look a key up.
+
+        param key: cache key
+        return: (True, value) on a hit, (False, None) on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            value, size, expires = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value, size: int, ttl: int = None,
+            generation: int = None) -> None:
+        """
+        Store a value, evicting least recently used entries to fit.
+
+        param key: cache key
+        param value: deserialized value
+        param size: serialized size in bytes
+        param ttl: seconds to keep it, capped by the tier's own TTL
+        param generation: the generation seen before the value was read;
+                          the value is dropped if it has changed since
+        """
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + ttl)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        """Drop a key if present."""
+        with self._lock:
+            self.generation += 1
+            self._remove(key)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self.bytes = 0
+
+    def _remove(self, key: str) -> None:
+        """Drop a key; the lock must be held."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def __len__(self):
+        return len(self._entries)
+
 
 class Cache:
-    """Redis cache handler Class"""
-    redis_client = redis.StrictRedis(host='localhost', port=6379, decode_responses=True)
+    """Redis cache handler Class
+
+    Redis is the shared tier. When CACHE_L1_MAX_BYTES is non-zero (the
+    default is 16 MiB) every process also keeps recently read entries in
+    an in-process LRU, kept for at most CACHE_L1_TTL seconds. Writes and
+    deletes are broadcast on a Redis pub/sub channel so that the L1 tier
+    of every API and worker process drops the key.
+
+    Values returned from the L1 tier are shared between callers and must
+    not be mutated.
 
-    def set_cache(self, key: str, value: dict) -> bool:
+    Expirations get +/- CACHE_TTL_JITTER (10%) of random jitter so keys
+    written together do not all expire together. get_or_compute() adds
+    stampede protection on top: a per-key Redis lock lets a single caller
+    recompute a key while the others wait briefly, or are served the
+    stale value during a grace window.
+
+    Derived values are cached with the cached() decorator under a key
+    built from a template and the generations of the tags (scopes) they
+    depend on, e.g. "course:<id>" for the projects of a course. A write
+    calls invalidate() with the tags it touches, which bumps their
+    generation counters so every key derived from them is never read
+    again and simply expires.
+
+    Values are stored as binary payloads written by a Codec (see
+    serializers.py), compressed above CACHE_COMPRESS_MIN_BYTES. The
+    client uses the process-wide pool of connection.py.
+    """
+    redis_client = get_redis()
+    codec = Codec()
+
+    INVALIDATION_CHANNEL = "cache:invalidate"
+    # tag whose "generation" is a random number identifying the dataset
+    EPOCH_TAG = "@epoch"
+    TTL_JITTER = float(os.getenv("CACHE_TTL_JITTER", 0.1))
+    LOCK_TIMEOUT = 30
+    # deletes the lock only if we still own it
+    RELEASE_LOCK = ("if redis.call('get', KEYS[1]) == ARGV[1] then "
+                    "return redis.call('del', KEYS[1]) end return 0")
+    local = None
+    origin = uuid.uuid4().hex
+    counters = {"l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0}
+    _counters_lock = threading.Lock()
+    _listener = None
+    _init_lock = threading.Lock()
+
+    def __init__(self):
+        """Set up the process-wide L1 tier on first use."""
+        max_bytes = int(os.getenv("CACHE_L1_MAX_BYTES", 16 * 1024 * 1024))
+        with Cache._init_lock:
+            if max_bytes > 0 and Cache.local is None:
+                Cache.local = LocalCache(max_bytes,
+                                         int(os.getenv("CACHE_L1_TTL", 30)))
+                Cache._listener = threading.Thread(
+                    target=self._listen, name="cache-invalidation",
+                    daemon=True)
+                Cache._listener.start()
+
+    def set_cache(self, key: str, value: dict, ex: int = 300) -> bool:
         """
         Set value in cache with expiration.
 
         param key: Redis key
         param value: Value to set in Redis
+        param ex: Expiration in seconds
         return: Success status
         """
-        # Serialize Python object to JSON string
-        self.redis_client.set(key, json.dumps(value, default=self._datetime_encoder), ex=300)
+        self.redis_client.set(key, self._dumps(value), ex=self._jitter(ex))
+        self._invalidate(key)
         return True
 
     def get_cache(self, key: str) -> list:
@@ -25,10 +179,28 @@ class Cache:
         param key: Redis key
         return: Cached value or None if no value
         """
-        cached_value = self.redis_client.get(key)
-        if cached_value:
-            # Deserialize JSON string back to Python object
-            return json.loads(cached_value, object_hook=self._datetime_decoder)
+        if self.local is not None:
+            hit, value = self.local.get(key)
+            if hit:
+                self._count("l1_hits")
+                return value
+            self._count("l1_misses")
+            generation = self.local.generation
+
+        if self.local is not None:
+            # fetch the remaining TTL in the same round-trip
+            cached_value, ttl = self.redis_client.pipeline() \
+                .get(key).ttl(key).execute()
+        else:
+            cached_value, ttl = self.redis_client.get(key), None
+        hit, value = self._decode(cached_value)
+        if hit:
+            self._count("l2_hits")
+            if self.local is not None:
+                self.local.set(key, value, len(cached_value),
+                               ttl if ttl and ttl > 0 else None, generation)
+            return value
+        self._count("l2_misses")
         return None
 
     def delete_cache(self, key: str) -> bool:
@@ -38,22 +210,431 @@ class Cache:
         param key: Redis key
         return: Success status
         """
-        self.redis_client.delete(key)
+        self.redis_client.delete(key, self._fresh_key(key))
+        self._invalidate(key)
+        return True
+
+    def get_many(self, keys) -> dict:
+        """
+        Retrieve several values in one round-trip.
+
+        param keys: list of Redis keys
+        return: dict of the keys found and their values
+        """
+        found = {}
+        remaining = []
+        for key in keys:
+            if self.local is not None:
+                hit, value = self.local.get(key)
+                if hit:
+                    self._count("l1_hits")
+                    found[key] = value
+                    continue
+                self._count("l1_misses")
+            remaining.append(key)
+        if not remaining:
+            return found
+
+        if self.local is not None:
+            generation = self.local.generation
+        pipeline = self.redis_client.pipeline(transaction=False)
+        pipeline.mget(remaining)
+        if self.local is not None:
+            for key in remaining:
+                pipeline.ttl(key)
+        replies = pipeline.execute()
+        ttls = replies[1:] or [None] * len(remaining)
+        for key, payload, ttl in zip(remaining, replies[0], ttls):
+            hit, value = self._decode(payload)
+            if not hit:
+                self._count("l2_misses")
+                continue
+            self._count("l2_hits")
+            found[key] = value
+            if self.local is not None:
+                self.local.set(key, value, len(payload),
+                               ttl if ttl and ttl > 0 else None, generation)
+        return found
+
+    def set_many(self, mapping: dict, ex: int = 300) -> bool:
+        """
+        Set several values in one round-trip.
+
+        param mapping: dict of Redis keys and values
+        param ex: Expiration in seconds
+        return: Success status
+        """
+        if not mapping:
+            return True
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipeline.set(key, self._dumps(value), ex=self._jitter(ex))
+        pipeline.execute()
+        self._invalidate(*mapping)
+        return True
+
+    def delete_many(self, keys) -> bool:
+        """
+        Delete several keys in one round-trip.
+
+        param keys: list of Redis keys
+        return: Success status
+        """
+        keys = list(keys)
+        if not keys:
+            return True
+        self.redis_client.delete(*keys, *map(self._fresh_key, keys))
+        self._invalidate(*keys)
         return True
 
+    def hydrate(self, ids, key: str, load, ex: int = 300,
+                tag: str = None) -> list:
+        """
+        Values of a list of entities cached one key per entity.
+
+        List caches hold only ids, so an entity is stored once however
+        many lists it is in. Entities missing from the cache are loaded
+        together and cached together.
+
+        With tag, each entity key is suffixed with the generation of the
+        entity's tag, like make_key() does. Invalidating the tag then
+        also retires a value that a reader loaded before the write and
+        stores after it.
+
+        param ids: list of entity ids
+        param key: str.format template of an entity key, e.g. "user:{}"
+        param load: callable taking a list of ids and returning a dict
+                    of id and value for the entities that exist
+        param ex: Expiration in seconds
+        param tag: str.format template of the tag of an entity
+        return: Values in ids order, without the ids that do not exist
+        """
+        keys = [key.format(entity_id) for entity_id in ids]
+        if tag is not None and ids:
+            generations = self.generations(
+                [tag.format(entity_id) for entity_id in ids])
+            keys = [f"{entity_key}@{generation}"
+                    for entity_key, generation in zip(keys, generations)]
+        by_id = dict(zip(ids, keys))
+        found = self.get_many(keys)
+        missing = [entity_id for entity_id, entity_key in zip(ids, keys)
+                   if entity_key not in found]
+        if missing:
+            loaded = {by_id[entity_id]: value
+                      for entity_id, value in load(missing).items()}
+            self.set_many(loaded, ex=ex)
+            found.update(loaded)
+        return [found[entity_key] for entity_key in keys
+                if entity_key in found]
+
+    def get_or_compute(self, key: str, compute, ex: int = 300,
+                       grace: int = 60, wait: float = 2.0):
+        """
+        Retrieve value from cache, computing and caching it on a miss.
+
+        Only one caller at a time recomputes a key, across processes.
+        Up to grace seconds after the value goes stale the other callers
+        get the stale value meanwhile; on a cold miss they poll for up to
+        wait seconds before computing it themselves.
+
+        param key: Redis key
+        param compute: zero-argument callable producing the value
+        param ex: Seconds the value stays fresh
+        param grace: Seconds a stale value may still be served
+        param wait: Seconds to wait for another caller's computation
+        return: The cached or computed value
+        """
+        if self.local is not None:
+            hit, value = self.local.get(key)
+            if hit:
+                self._count("l1_hits")
+                return value
+            self._count("l1_misses")
+        else:
+            generation = None
+
+        fresh, hit, value = self._read_fresh(key, generation)
+        if fresh:
+            return value
+
+        token = self._lock(key, self.LOCK_TIMEOUT)
+        if token is None:
+            if hit:
+                # someone else is refreshing it; serve the stale value
+                self._count("l2_hits")
+                return value
+            deadline = time.monotonic() + wait
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                hit, value = self._decode(self.redis_client.get(key))
+                if hit:
+                    self._count("l2_hits")
+                    return value
+                # the holder gave up without filling it
+                token = self._lock(key, self.LOCK_TIMEOUT)
+                if token is not None:
+                    break
+
+        try:
+            if token is not None:
+                # the previous holder may have filled it since it was read
+                fresh, hit, value = self._read_fresh(key, generation)
+                if fresh:
+                    return value
+            self._count("l2_misses")
+            value = compute()
+            ex = self._jitter(ex)
+            self.redis_client.pipeline() \
+                .set(key, self._dumps(value), ex=ex + grace) \
+                .set(self._fresh_key(key), 1, ex=ex) \
+                .execute()
+            self._invalidate(key)
+            return value
+        finally:
+            if token is not None:
+                self.redis_client.eval(self.RELEASE_LOCK, 1,
+                                       self._lock_key(key), token)
+
+    def cached(self, key: str, tags=(), ex: int = 300, grace: int = 60):
+        """
+        Decorator caching the return value of a function.
+
+        key and tags are str.format templates filled in with the
+        function's arguments by name, e.g.
+        @cache.cached("projects:course:{course_id}", tags=("course:{course_id}",)).
+        Exceptions raised by the function (such as abort(404)) are not
+        cached. The undecorated function stays available as .uncached.
+
+        param key: Key template
+        param tags: Templates of the tags the value depends on
+        param ex: Seconds the value stays fresh
+        param grace: Seconds a stale value may still be served
+        return: The decorator
+        """
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                params = bound.arguments
+                full_key = self.make_key(
+                    key.format(**params),
+                    [tag.format(**params) for tag in tags])
+                return self.get_or_compute(
+                    full_key, lambda: func(*args, **kwargs),
+                    ex=ex, grace=grace)
+
+            wrapper.uncached = func
+            return wrapper
+        return decorator
+
+    def make_key(self, name: str, tags=()) -> str:
+        """
+        Build the key of a value derived from tags.
+
+        param name: Key of the value itself
+        param tags: Tags the value depends on
+        return: name suffixed with the current generation of each tag
+        """
+        if not tags:
+            return name
+        generations = self.generations(tags)
+        return f"{name}@" + ".".join(str(g) for g in generations)
+
+    def generations(self, tags) -> list:
+        """
+        Current generation counter of each tag, in one round-trip.
+
+        param tags: list of tags
+        return: list of ints, 0 for tags never invalidated
+        """
+        keys = [self._generation_key(tag) for tag in tags]
+        values = [None] * len(keys)
+        missing = []
+        for i, key in enumerate(keys):
+            if self.local is not None:
+                hit, value = self.local.get(key)
+                if hit:
+                    values[i] = value
+                    continue
+            missing.append(i)
+        if missing:
+            if self.local is not None:
+                generation = self.local.generation
+            fetched = self.redis_client.mget([keys[i] for i in missing])
+            for i, value in zip(missing, fetched):
+                values[i] = int(value or 0)
+                if self.local is not None:
+                    self.local.set(keys[i], values[i], len(value or b"0"),
+                                   generation=generation)
+        return values
+
+    def epoch_generations(self, tags) -> list:
+        """
+        Generations of tags, preceded by the epoch of the Redis dataset.
+
+        The counters start over when Redis loses its data (a restart
+        without persistence, a flush), so a value derived from them and
+        kept outside Redis, such as an ETag, must include the epoch too:
+        a random number stored on first use, which is gone whenever the
+        counters are.
+
+        param tags: list of tags
+        return: list of ints, the epoch then one generation per tag
+        """
+        generations = self.generations([self.EPOCH_TAG, *tags])
+        if not generations[0]:
+            key = self._generation_key(self.EPOCH_TAG)
+            self.redis_client.set(key, random.getrandbits(62) or 1, nx=True)
+            self._invalidate(key)
+            generations = self.generations([self.EPOCH_TAG, *tags])
+        return generations
+
+    def invalidate(self, *tags) -> None:
+        """
+        Invalidate every value derived from any of tags.
+
+        A write passes the tags of every list it changes, e.g. "users"
+        for the list of users or "course:<id>" for the projects of a
+        course; the entries of the objects themselves are dropped with
+        forget() (see api.v1.utils.entities).
+
+        param tags: Tags touched by a write
+        """
+        keys = [self._generation_key(tag) for tag in tags]
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.incr(key)
+        pipeline.execute()
+        self._invalidate(*keys)
+
+    def incr(self, key: str) -> int:
+        """
+        Atomically increment an integer counter that never expires.
+
+        param key: Redis key
+        return: The new value
+        """
+        value = self.redis_client.incr(key)
+        self._invalidate(key)
+        return value
+
+    def stats(self) -> dict:
+        """
+        Hit and miss counters per tier, plus L1 occupancy.
+
+        return: dict of counters
+        """
+        with Cache._counters_lock:
+            stats = dict(self.counters)
+        if self.local is not None:
+            stats.update({"l1_entries": len(self.local),
+                          "l1_bytes": self.local.bytes,
+                          "l1_max_bytes": self.local.max_bytes,
+                          "l1_evictions": self.local.evictions})
+        return stats
+
+    def _jitter(self, ex: int) -> int:
+        """Spread an expiration by the configured jitter."""
+        if not ex or self.TTL_JITTER <= 0:
+            return ex
+        spread = ex * self.TTL_JITTER
+        return max(1, int(round(ex + random.uniform(-spread, spread))))
+
+    def _read_fresh(self, key: str, generation: int = None):
+        """
+        Read a get_or_compute() value, filling the L1 tier if it is fresh.
+
+        param key: Redis key
+        param generation: L1 generation seen before the read
+        return: (fresh, hit, value)
+        """
+        cached_value, fresh_ttl = self.redis_client.pipeline() \
+            .get(key).ttl(self._fresh_key(key)).execute()
+        hit, value = self._decode(cached_value)
+        if not (hit and fresh_ttl and fresh_ttl > 0):
+            return False, hit, value
+        self._count("l2_hits")
+        if self.local is not None:
+            self.local.set(key, value, len(cached_value), fresh_ttl,
+                           generation)
+        return True, hit, value
+
+    def _lock(self, key: str, timeout: int):
+        """Try to take the recompute lock of key; returns its token."""
+        token = uuid.uuid4().hex
+        if self.redis_client.set(self._lock_key(key), token, nx=True,
+                                 ex=max(1, int(timeout))):
+            return token
+        return None
+
     @staticmethod
-    def _datetime_encoder(obj):
-        """Custom JSON encoder for datetime objects."""
-        if isinstance(obj, datetime):
-            return obj.isoformat()  # Convert datetime to ISO 8601 string
-        raise TypeError("Type not serializable")
+    def _generation_key(tag: str) -> str:
+        """Counter bumped whenever tag is invalidated."""
+        return f"gen:{tag}"
 
     @staticmethod
-    def _datetime_decoder(obj):
-        """Custom JSON decoder for datetime objects."""
-        for key, value in obj.items():
+    def _fresh_key(key: str) -> str:
+        """Marker whose presence means key is still fresh."""
+        return f"fresh:{key}"
+
+    @staticmethod
+    def _lock_key(key: str) -> str:
+        """Recompute lock of key."""
+        return f"lock:{key}"
+
+    def _dumps(self, value) -> bytes:
+        """Serialize a value for Redis."""
+        return self.codec.dumps(value)
+
+    def _decode(self, payload):
+        """
+        Deserialize a value read from Redis.
+
+        param payload: Redis reply, None for a missing key
+        return: (True, value), or (False, None) when missing or undecodable
+        """
+        if payload is None:
+            return False, None
+        try:
+            return True, self.codec.loads(payload)
+        except SerializationError:
+            return False, None
+
+    def _count(self, counter: str) -> None:
+        """Bump one of the tier counters."""
+        with Cache._counters_lock:
+            Cache.counters[counter] += 1
+
+    def _invalidate(self, *keys) -> None:
+        """Drop keys from this process's L1 tier and tell the others."""
+        if self.local is None:
+            return
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for key in keys:
+            self.local.delete(key)
+            pipeline.publish(self.INVALIDATION_CHANNEL,
+                             f"{self.origin}:{key}")
+        pipeline.execute()
+
+    def _listen(self) -> None:
+        """Evict keys invalidated by other processes, forever."""
+        while True:
             try:
-                obj[key] = datetime.fromisoformat(value)  # Parse ISO 8601 string to datetime
-            except (ValueError, TypeError):
-                pass
-        return obj
+                pubsub = get_blocking_redis().pubsub(
+                    ignore_subscribe_messages=True)
+                pubsub.subscribe(self.INVALIDATION_CHANNEL)
+                # anything may have changed while we were not listening
+                self.local.clear()
+                for message in pubsub.listen():
+                    origin, _, key = message["data"].decode() \
+                        .partition(":")
+                    if origin != self.origin:
+                        self.local.delete(key)
+            except Exception as e:
+                print(f"Cache invalidation listener error: {e}",
+                      file=sys.stderr)
+                self.local.clear()
+                time.sleep(1)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Process-wide Redis connection pool.
+
+The cache, the grading queue, job lookups, progress events and the
+worker all talk to Redis through clients sharing one pool per process,
+instead of opening a connection per request. The clients return bytes,
+which is what RQ requires.
+
+When every connection is in use a caller waits up to REDIS_POOL_TIMEOUT
+seconds for one to be released instead of failing straight away.
+
+Clients that block on purpose, the RQ worker's BLPOP and the pub/sub
+listeners of the cache and of the progress hub, use get_blocking_redis()
+instead: a second pool without a socket timeout, whose idle connections
+are kept alive with TCP keepalive and pinged before reuse. A reply
+timeout there would kill the worker or restart the listeners every few
+seconds.
+
+Configuration comes from the environment:
+    REDIS_URL                    redis://[:password@]host:port/db; when
+                                 set it takes precedence over the
+                                 variables below
+    REDIS_HOST                   (default localhost)
+    REDIS_PORT                   (default 6379)
+    REDIS_DB                     (default 0)
+    REDIS_PASSWORD               (default none)
+    REDIS_MAX_CONNECTIONS        connections per process (default 50)
+    REDIS_POOL_TIMEOUT           seconds to wait for a free connection (5)
+    REDIS_SOCKET_TIMEOUT         seconds to wait for a reply (5), except
+                                 on the blocking pool
+    REDIS_CONNECT_TIMEOUT        seconds to wait for a connection (2)
+    REDIS_HEALTH_CHECK_INTERVAL  idle seconds before a connection is
+                                 pinged before use (30)
+"""
+import os
+import threading
+
+import redis
+
+_pool = None
+_blocking_pool = None
+_pool_lock = threading.Lock()
+
+
+def _pool_kwargs():
+    """Pool settings read from the environment."""
+    return {
+        'max_connections': int(os.getenv('REDIS_MAX_CONNECTIONS', 50)),
+        'timeout': float(os.getenv('REDIS_POOL_TIMEOUT', 5)),
+        'socket_timeout': float(os.getenv('REDIS_SOCKET_TIMEOUT', 5)),
+        'socket_connect_timeout': float(os.getenv('REDIS_CONNECT_TIMEOUT', 2)),
+        'health_check_interval': int(
+            os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 30)),
+    }
+
+
+def _blocking_pool_kwargs():
+    """Settings of the pool of the clients that block on purpose."""
+    kwargs = _pool_kwargs()
+    kwargs.update({
+        # the worker, the cache listener and the progress listener
+        'max_connections': 8,
+        'socket_timeout': None,
+        'socket_keepalive': True,
+    })
+    return kwargs
+
+
+def _make_pool(kwargs):
+    """A pool for the configured server with the given settings."""
+    url = os.getenv('REDIS_URL')
+    if url:
+        return redis.BlockingConnectionPool.from_url(url, **kwargs)
+    return redis.BlockingConnectionPool(
+        host=os.getenv('REDIS_HOST', 'localhost'),
+        port=int(os.getenv('REDIS_PORT', 6379)),
+        db=int(os.getenv('REDIS_DB', 0)),
+        password=os.getenv('REDIS_PASSWORD') or None,
+        **kwargs)
+
+
+def get_pool():
+    """Return the process-wide connection pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = _make_pool(_pool_kwargs())
+        return _pool
+
+
+def get_redis():
+    """Return a client using the process-wide pool."""
+    return redis.StrictRedis(connection_pool=get_pool())
+
+
+def get_blocking_redis():
+    """Return a client without a reply timeout, for BLPOP and pub/sub."""
+    global _blocking_pool
+    with _pool_lock:
+        if _blocking_pool is None:
+            _blocking_pool = _make_pool(_blocking_pool_kwargs())
+    return redis.StrictRedis(connection_pool=_blocking_pool)
+
+
+def pool_stats():
+    """Utilization of the process-wide pool."""
+    pool = get_pool()
+    # the queue holds idle connections plus None for unopened slots
+    slots = list(pool.pool.queue)
+    idle = sum(1 for conn in slots if conn is not None)
+    created = pool.max_connections - (len(slots) - idle)
+    kwargs = pool.connection_kwargs
+    return {
+        'host': kwargs.get('host'),
+        'port': kwargs.get('port'),
+        'db': kwargs.get('db'),
+        'max_connections': pool.max_connections,
+        'created': created,
+        'in_use': created - idle,
+        'idle': idle,
+    }
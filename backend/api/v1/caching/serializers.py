@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""Codecs turning cached values into Redis payloads and back.
+
+A payload is a two byte header followed by the body: the first byte
+names the serializer, the second the compression. Readers pick the codec
+from the header, so processes configured differently can still share
+keys, and a payload nobody can decode is simply a miss.
+
+Datetimes are encoded explicitly as datetimes (a {"__datetime__": iso}
+object in JSON, an extension type in msgpack) instead of being guessed
+back from any string that parses as one.
+
+Configuration comes from the environment:
+    CACHE_SERIALIZER         orjson, msgpack or json (default: the first
+                             one installed, in that order)
+    CACHE_COMPRESSION        zstd, zlib or none (default: zstd if
+                             installed, zlib otherwise)
+    CACHE_COMPRESS_MIN_BYTES bodies at least this large are compressed
+                             (default 1024)
+"""
+import json
+import os
+import threading
+import zlib
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DATETIME_TAG = "__datetime__"
+MSGPACK_DATETIME = 1
+
+
+class SerializationError(Exception):
+    """Raised when a payload cannot be decoded."""
+
+
+def _encode_datetime(obj):
+    """default hook for the JSON codecs."""
+    if isinstance(obj, datetime):
+        return {DATETIME_TAG: obj.isoformat()}
+    raise TypeError(f"Type {type(obj).__name__} not serializable")
+
+
+def _decode_datetime(obj):
+    """object_hook for the JSON codecs."""
+    if len(obj) == 1 and DATETIME_TAG in obj:
+        return datetime.fromisoformat(obj[DATETIME_TAG])
+    return obj
+
+
+def _revive(value):
+    """Apply _decode_datetime to every object of a decoded value."""
+    if isinstance(value, dict):
+        if len(value) == 1 and DATETIME_TAG in value:
+            return _decode_datetime(value)
+        for key, item in value.items():
+            if isinstance(item, (dict, list)):
+                value[key] = _revive(item)
+        return value
+    if isinstance(value, list):
+        for i, item in enumerate(value):
+            if isinstance(item, (dict, list)):
+                value[i] = _revive(item)
+    return value
+
+
+class JsonSerializer:
+    """Standard library json."""
+    tag = b"j"
+
+    def dumps(self, value) -> bytes:
+        return json.dumps(value, default=_encode_datetime,
+                          separators=(",", ":")).encode()
+
+    def loads(self, body: bytes):
+        return json.loads(body, object_hook=_decode_datetime)
+
+
+class OrjsonSerializer:
+    """orjson, with datetimes passed through to the typed encoding."""
+    tag = b"o"
+
+    def dumps(self, value) -> bytes:
+        return orjson.dumps(value, default=_encode_datetime,
+                            option=orjson.OPT_PASSTHROUGH_DATETIME)
+
+    def loads(self, body: bytes):
+        value = orjson.loads(body)
+        # orjson has no object_hook; only walk when a datetime is inside
+        if DATETIME_TAG.encode() in body:
+            value = _revive(value)
+        return value
+
+
+class MsgpackSerializer:
+    """msgpack, with datetimes as an extension type."""
+    tag = b"m"
+
+    @staticmethod
+    def _default(obj):
+        if isinstance(obj, datetime):
+            return msgpack.ExtType(MSGPACK_DATETIME, obj.isoformat().encode())
+        raise TypeError(f"Type {type(obj).__name__} not serializable")
+
+    @staticmethod
+    def _ext_hook(code, data):
+        if code == MSGPACK_DATETIME:
+            return datetime.fromisoformat(data.decode())
+        return msgpack.ExtType(code, data)
+
+    def dumps(self, value) -> bytes:
+        return msgpack.packb(value, default=self._default, use_bin_type=True)
+
+    def loads(self, body: bytes):
+        return msgpack.unpackb(body, ext_hook=self._ext_hook, raw=False)
+
+
+SERIALIZERS = {
+    'orjson': (OrjsonSerializer, orjson),
+    'msgpack': (MsgpackSerializer, msgpack),
+    'json': (JsonSerializer, json),
+}
+
+COMPRESSIONS = {
+    'none': b"-",
+    'zlib': b"z",
+    'zstd': b"s",
+}
+
+
+class Codec:
+    """Serializer plus compression of cache payloads."""
+
+    def __init__(self, serializer=None, compression=None, min_bytes=None):
+        """Pick the configured, or fastest installed, serializer and
+        compression."""
+        serializer = serializer or os.getenv('CACHE_SERIALIZER')
+        if serializer is None:
+            serializer = next(name for name, (_, module)
+                              in SERIALIZERS.items() if module is not None)
+        cls, module = SERIALIZERS[serializer]
+        if module is None:
+            raise ImportError(f"{serializer} is not installed")
+        self.serializer = cls()
+        self._by_tag = {c.tag: c() for c, m in SERIALIZERS.values()
+                        if m is not None}
+
+        compression = compression or os.getenv('CACHE_COMPRESSION') or \
+            ('zstd' if zstandard is not None else 'zlib')
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError("zstandard is not installed")
+        self.compression = COMPRESSIONS[compression]
+        if min_bytes is None:
+            min_bytes = int(os.getenv('CACHE_COMPRESS_MIN_BYTES', 1024))
+        self.min_bytes = min_bytes
+        # zstd contexts are not thread-safe; each thread gets its own
+        self._zstd = threading.local()
+
+    def _zstd_compressor(self):
+        """This thread's zstd compressor."""
+        compressor = getattr(self._zstd, 'compressor', None)
+        if compressor is None:
+            compressor = self._zstd.compressor = \
+                zstandard.ZstdCompressor(level=3)
+        return compressor
+
+    def _zstd_decompressor(self):
+        """This thread's zstd decompressor."""
+        decompressor = getattr(self._zstd, 'decompressor', None)
+        if decompressor is None:
+            decompressor = self._zstd.decompressor = \
+                zstandard.ZstdDecompressor()
+        return decompressor
+
+    @property
+    def name(self) -> str:
+        """Human readable name, e.g. orjson+zlib."""
+        compression = next(n for n, t in COMPRESSIONS.items()
+                           if t == self.compression)
+        return f"{type(self.serializer).__name__[:-10].lower()}+{compression}"
+
+    def dumps(self, value) -> bytes:
+        """Encode value into a payload."""
+        body = self.serializer.dumps(value)
+        compression = COMPRESSIONS['none']
+        if len(body) >= self.min_bytes and self.compression != compression:
+            compression = self.compression
+            if compression == COMPRESSIONS['zstd']:
+                body = self._zstd_compressor().compress(body)
+            else:
+                body = zlib.compress(body, 1)
+        return self.serializer.tag + compression + body
+
+    def loads(self, payload: bytes):
+        """Decode a payload written by any process's dumps()."""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        serializer = self._by_tag.get(payload[:1])
+        compression, body = payload[1:2], payload[2:]
+        if serializer is None:
+            raise SerializationError("unknown serializer")
+        try:
+            if compression == COMPRESSIONS['zlib']:
+                body = zlib.decompress(body)
+            elif compression == COMPRESSIONS['zstd']:
+                if zstandard is None:
+                    raise SerializationError("zstandard is not installed")
+                body = self._zstd_decompressor().decompress(body)
+            elif compression != COMPRESSIONS['none']:
+                raise SerializationError("unknown compression")
+            return serializer.loads(body)
+        except SerializationError:
+            raise
+        except Exception as e:
+            raise SerializationError(str(e)) from e
@@ -4,12 +4,46 @@
 This module is intended to be run by an RQ worker. The `process_submission`
 function receives identifiers and runs the tests, saving TestResult objects
 and updating the Submission status.
+
+Grading happens in two phases inside one warm sandbox taken from the
+pool in api.v1.tasks.sandbox: a build phase that runs once per submission
+(compiling C sources), then a run phase that executes the built program
+once per test case.
+
+In the default `batch` mode (GRADER_MODE) the run phase is a single
+sandbox command: every test case input is written into the workspace and
+harness.sh runs them all, each under its own timeout, and reports one
+line per case. `per_case` mode issues one sandbox command per test case.
+
+Test cases of one submission are independent, so the run phase spreads
+them over several pooled sandboxes in parallel (GRADER_JOB_CONCURRENCY).
+Each sandbox is capped at SANDBOX_CPUS, and the number of sandboxes a job
+uses at once is bounded by GRADER_CPU_BUDGET / SANDBOX_CPUS so a worker
+never asks for more CPU than it was given.
+
+Outcomes are cached in Redis by a content hash of the source, the
+language and the task's test case set (see `_result_key`), so a
+byte-identical resubmission reuses them without running anything. The
+test case views call `bump_test_case_version` on every change, which
+moves the task to fresh keys; stale entries expire or are evicted by
+Redis (volatile-lru, which only evicts keys with a TTL). Runs whose
+outcome depends on the machine rather than the code, such as a timeout
+or a sandbox failure, are not cached.
+
+Progress is published as it happens (see api.v1.tasks.progress): a
+`running` event when the job starts, one `test-passed`/`test-failed`
+event per test case as soon as its lane finishes, then `done`.
 """
+import hashlib
 import os
+import shlex
 import shutil
+import stat
 import subprocess
-import tempfile
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rq import get_current_job
 
 from models import storage
 from models.test_case import TestCase
@@ -17,11 +51,315 @@ from models.test_result import TestResult
 from models.submission import Submission
 from models.project import Project
 from models.task import Task
+from api.v1.tasks import progress
+from api.v1.tasks.sandbox import SANDBOX_CPUS, get_pool
+from api.v1.caching.cache import Cache
+
+
+# How each language is built and run inside the sandbox. Commands run
+# with the workspace as working directory (/work).
+LANGUAGES = {
+    'Python': {
+        'image': 'devarena/python-runner:latest',
+        'source': 'main.py',
+        'compile': None,
+        'run': 'python3 main.py',
+    },
+    'C': {
+        'image': 'devarena/c-runner:latest',
+        'source': 'main.c',
+        'compile': 'gcc main.c -o main',
+        'run': './main',
+    },
+}
+
+COMPILE_TIMEOUT = 12
+RUN_TIMEOUT = 8
+# most bytes of a case's stdout read back from the workspace
+MAX_OUTPUT_BYTES = 1024 * 1024
+HARNESS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       'harness.sh')
+GRADER_MODE = os.getenv('GRADER_MODE', 'batch')
+GRADER_JOB_CONCURRENCY = int(os.getenv('GRADER_JOB_CONCURRENCY', 4))
+GRADER_CPU_BUDGET = float(os.getenv('GRADER_CPU_BUDGET', os.cpu_count() or 1))
+RESULT_CACHE_TTL = int(os.getenv('GRADER_RESULT_CACHE_TTL', 7 * 24 * 3600))
+
+cache = Cache()
+
+
+def bump_test_case_version(task_id):
+    """Invalidate the cached outcomes of every submission to task_id."""
+    try:
+        cache.invalidate(f"task:{task_id}")
+    except Exception as e:
+        print("Failed to bump test case version:", str(e))
+
+
+def _result_key(source, language, task_id, test_cases):
+    """Content hash identifying one grading outcome.
+
+    Besides the version counter the hash covers the test cases actually
+    loaded, so a lost or evicted counter cannot resurrect old outcomes.
+    """
+    digest = hashlib.sha256()
+    version = cache.generations([f"task:{task_id}"])[0]
+    digest.update(f"{language}\0{task_id}\0{version}\0".encode())
+    for test_case in test_cases:
+        for field in ('id', 'input', 'expected'):
+            digest.update(str(test_case.get(field)).encode() + b"\0")
+    digest.update(source)
+    return "grader:result:" + digest.hexdigest()
+
+
+def _cached_results(key, submission_id):
+    """Return the cached outcomes for key re-bound to submission_id."""
+    try:
+        cached = cache.get_cache(key)
+    except Exception:
+        return None
+    if not cached:
+        return None
+    return [dict(result, submission_id=submission_id) for result in cached]
+
+
+def _store_results(key, results):
+    """Cache the outcomes of a run."""
+    outcomes = [{k: v for k, v in result.items() if k != 'submission_id'}
+                for result in results]
+    try:
+        cache.set_cache(key, outcomes, ex=RESULT_CACHE_TTL)
+    except Exception as e:
+        print("Failed to cache grading results:", str(e))
+
+
+def order_key(order_index):
+    """Sort key for a test case's order_index, numeric when it holds a
+    number; the test case views list cases in the same order."""
+    order = str(order_index or '')
+    return (0, int(order), '') if order.isdigit() else (1, 0, order)
+
+
+def _result(submission_id, task_id, test_case, passed, actual_output=None,
+            transient=False):
+    """Build the TestResult fields for one test case.
+
+    transient marks an outcome caused by the machine (a timeout, a
+    sandbox failure) rather than by the code; _grade drops the flag
+    before saving and does not cache a run that has one.
+    """
+    result = {
+        'submission_id': submission_id,
+        'task_id': task_id,
+        'test_case_id': test_case['id'],
+        'name': test_case.get('name'),
+        'status': 'passed' if passed else 'failed',
+        'passed': passed
+    }
+    if actual_output is not None:
+        result['actual_output'] = actual_output
+    if transient:
+        result['transient'] = True
+    return result
 
 
-def _safe_run(cmd, cwd=None, input_data=None, timeout=5):
-    """Run subprocess safely and return CompletedProcess or raise."""
-    return subprocess.run(cmd, capture_output=True, text=True, input=input_data, timeout=timeout, cwd=cwd)
+def _check(submission_id, task_id, test_case, code_result):
+    """Compare a run's stdout with the test case's expected output."""
+    expected = test_case.get('expected')
+    if expected is None:
+        # No expected field; store stdout as result
+        return _result(submission_id, task_id, test_case, True,
+                       code_result.stdout)
+    if code_result.stdout.strip() == expected.strip():
+        return _result(submission_id, task_id, test_case, True)
+    return _result(submission_id, task_id, test_case, False,
+                   code_result.stdout)
+
+
+def _build(spec, sandbox):
+    """Compile the workspace source once.
+
+    Returns None on success, or the output to record against every test
+    case when the build fails.
+    """
+    if spec['compile'] is None:
+        return None
+    try:
+        compiled = sandbox.exec(spec['compile'], COMPILE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return 'compile timeout'
+    if compiled.returncode != 0:
+        return compiled.stderr
+    return None
+
+
+def _run_case(spec, sandbox, submission_id, task_id, test_case):
+    """Run the built program against one test case."""
+    try:
+        code_result = sandbox.exec(spec['run'], RUN_TIMEOUT,
+                                   input_data=test_case.get('input', ''))
+        return _check(submission_id, task_id, test_case, code_result)
+    except subprocess.TimeoutExpired:
+        return _result(submission_id, task_id, test_case, False, 'timeout',
+                       transient=True)
+    except Exception as e:
+        return _result(submission_id, task_id, test_case, False, str(e),
+                       transient=True)
+
+
+def _read_output(dir_fd, name):
+    """Read a case's stdout from the workspace's out/ directory.
+
+    The code under test owns the workspace and can swap the file for a
+    link to any host path, so links are not followed, only a regular
+    file is read, and at most MAX_OUTPUT_BYTES + 1 bytes of it.
+    """
+    fd = os.open(name, os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK,
+                 dir_fd=dir_fd)
+    with open(fd, 'rb') as f:
+        if not stat.S_ISREG(os.fstat(f.fileno()).st_mode):
+            raise OSError(f"{name} is not a regular file")
+        return f.read(MAX_OUTPUT_BYTES + 1)
+
+
+def _run_batch(spec, sandbox, submission_id, task_id, test_cases):
+    """Run the built program against every test case with one harness
+    invocation and return the results in test case order."""
+    cases_dir = os.path.join(sandbox.workdir, 'cases')
+    os.makedirs(cases_dir)
+    # the sandbox user wipes the workspace between jobs
+    os.chmod(cases_dir, 0o777)
+    for i, test_case in enumerate(test_cases):
+        with open(os.path.join(cases_dir, f"{i}.in"), 'w') as f:
+            f.write(test_case.get('input') or '')
+    shutil.copy(HARNESS, os.path.join(sandbox.workdir, 'harness.sh'))
+
+    count = len(test_cases)
+    cmd = f"sh harness.sh {RUN_TIMEOUT} {count} {shlex.quote(spec['run'])}"
+    # the cases run back to back; allow for the kill grace
+    try:
+        done = sandbox.exec(cmd, (RUN_TIMEOUT + 1) * count + 5)
+    except subprocess.TimeoutExpired:
+        return [_result(submission_id, task_id, test_case, False, 'timeout',
+                        transient=True)
+                for test_case in test_cases]
+
+    manifest = {}
+    for line in done.stdout.splitlines():
+        parts = line.split()
+        if len(parts) == 3 and all(p.lstrip('-').isdigit() for p in parts):
+            manifest[int(parts[0])] = (int(parts[1]), int(parts[2]))
+
+    results = []
+    try:
+        out_fd = os.open(os.path.join(sandbox.workdir, 'out'),
+                         os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW)
+    except OSError:
+        out_fd = None
+    for i, test_case in enumerate(test_cases):
+        if i not in manifest:
+            results.append(_result(submission_id, task_id, test_case, False,
+                                   done.stderr or 'no result',
+                                   transient=True))
+            continue
+        returncode, elapsed_ms = manifest[i]
+        if returncode == 124 or \
+                (returncode == 137 and elapsed_ms >= RUN_TIMEOUT * 1000):
+            results.append(_result(submission_id, task_id, test_case, False,
+                                   'timeout', transient=True))
+            continue
+        try:
+            if out_fd is None:
+                raise OSError("out/ is missing")
+            stdout = _read_output(out_fd, f"{i}.out")
+        except OSError:
+            # the workspace is writable by the code under test, which
+            # can remove or replace out/ like any other file
+            results.append(_result(submission_id, task_id, test_case, False,
+                                   'no output'))
+            continue
+        if len(stdout) > MAX_OUTPUT_BYTES:
+            results.append(_result(submission_id, task_id, test_case, False,
+                                   'output limit exceeded'))
+            continue
+        code_result = subprocess.CompletedProcess(
+            spec['run'], returncode, stdout.decode(errors='replace'), '')
+        results.append(_check(submission_id, task_id, test_case,
+                              code_result))
+    if out_fd is not None:
+        os.close(out_fd)
+    return results
+
+
+def _run_chunk(spec, sandbox, submission_id, task_id, test_cases,
+               report=None):
+    """Run a list of test cases in one sandbox, in the configured mode,
+    passing results to report as soon as they are known."""
+    report = report or (lambda results: None)
+    if GRADER_MODE == 'batch':
+        results = _run_batch(spec, sandbox, submission_id, task_id,
+                             test_cases)
+        report(results)
+        return results
+    results = []
+    for test_case in test_cases:
+        result = _run_case(spec, sandbox, submission_id, task_id, test_case)
+        report([result])
+        results.append(result)
+    return results
+
+
+def _reporter(job_id):
+    """Return a report callback publishing one event per test result."""
+    def report(results):
+        for result in results:
+            result = {k: v for k, v in result.items() if k != 'transient'}
+            progress.publish(cache.redis_client, job_id,
+                             'test-passed' if result.get('passed')
+                             else 'test-failed', result)
+    return report
+
+
+def _run_parallel(pool, spec, sandbox, submission_id, task_id, test_cases,
+                  report=None):
+    """Spread the test cases over the built sandbox and as many extra
+    sandboxes as concurrency and CPU budget allow, returning the results
+    in test case order."""
+    slots = min(GRADER_JOB_CONCURRENCY, int(GRADER_CPU_BUDGET // SANDBOX_CPUS),
+                pool.size, len(test_cases))
+    extras = []
+    try:
+        while len(extras) < slots - 1:
+            try:
+                extra = pool.acquire(spec['image'], timeout=0)
+            except Exception:
+                # pool exhausted; run with what we have
+                break
+            extras.append(extra)
+            # reuse the build instead of compiling again
+            shutil.copytree(sandbox.workdir, extra.workdir,
+                            dirs_exist_ok=True)
+
+        sandboxes = [sandbox] + extras
+        if len(sandboxes) == 1:
+            return _run_chunk(spec, sandbox, submission_id, task_id,
+                              test_cases, report)
+
+        lanes = len(sandboxes)
+        chunks = [test_cases[k::lanes] for k in range(lanes)]
+        with ThreadPoolExecutor(max_workers=lanes) as executor:
+            chunk_results = list(executor.map(
+                lambda k: _run_chunk(spec, sandboxes[k], submission_id,
+                                     task_id, chunks[k], report),
+                range(lanes)))
+
+        results = [None] * len(test_cases)
+        for k, chunk in enumerate(chunk_results):
+            for j, result in enumerate(chunk):
+                results[k + j * lanes] = result
+        return results
+    finally:
+        for extra in extras:
+            pool.release(extra)
 
 
 def process_submission(submission_id, task_id, project_id, user_id, language, file_url):
@@ -34,192 +372,120 @@ def process_submission(submission_id, task_id, project_id, user_id, language, fi
         user_id (str)
         language (str)
         file_url (str): path to the submitted file
+
+    Returns a summary with the number of results and the time spent in
+    the build and run phases, in seconds. Progress is published under
+    the id of the RQ job running it, if any.
     """
+    job = get_current_job()
+    job_id = job.get_id() if job is not None else None
+    progress.publish(cache.redis_client, job_id, 'running',
+                     {'submission_id': submission_id, 'task_id': task_id})
+    try:
+        summary = _grade(submission_id, task_id, language, file_url,
+                         _reporter(job_id))
+    except Exception as e:
+        progress.publish(cache.redis_client, job_id, 'error',
+                         {'message': str(e)})
+        raise
+    progress.publish(cache.redis_client, job_id, 'done', summary)
+    return summary
+
+
+def _grade(submission_id, task_id, language, file_url, report):
+    """Grade a submission, passing test results to report as they are
+    known, and return the job summary."""
     submission = storage.get(Submission, submission_id)
     if not submission:
         # Nothing to do
         return {'error': 'submission not found'}
 
     # gather test cases for task
-    test_cases = storage.all(TestCase).values()
-    test_case_list = [test_case.to_dict() for test_case in test_cases if test_case.task_id == task_id]
+    test_cases = storage.search(TestCase, {"task_id": task_id},
+                                order_by="order_index")
+    test_case_list = sorted(
+        (test_case.to_dict() for test_case in test_cases),
+        key=lambda test_case: order_key(test_case.get('order_index')))
+
+    # Ensure submission file exists
+    if not os.path.exists(file_url):
+        return {'error': "submitted file missing"}
 
     results = []
-    tmpdir = tempfile.mkdtemp(prefix=f"grader_{user_id}_")
+    compile_time = 0.0
+    run_time = 0.0
+    key = None
+    cached = None
 
     try:
-        # Ensure submission file exists
-        if not os.path.exists(file_url):
-            return {'error': "submitted file missing"}
-
-        # compile/run per language
-        def _run_in_docker(image, cmd, workdir, timeout_sec):
-            docker_cmd = [
-                'docker', 'run', '--rm',
-                '--net', 'none',
-                '--pids-limit', '64',
-                '--cpus', '0.5',
-                '--memory', '128m',
-                '--read-only',
-                '-v', f"{workdir}:/work:rw",
-                '--user', '1000:1000',
-                '--cap-drop', 'ALL',
-                image,
-                'sh', '-c', cmd
-            ]
-            return subprocess.run(docker_cmd, capture_output=True, text=True, timeout=timeout_sec)
-
-        for test_case in test_case_list:
+        spec = LANGUAGES.get(language)
+        if spec is not None and test_case_list:
+            with open(file_url, 'rb') as f:
+                source = f.read()
             try:
-                code_result = None
-                test_result = None
-
-                input_data = test_case.get('input', '')
-                if language == 'Python':
-                    # Prefer running inside Docker sandbox; fallback to local if docker not available
-                    try:
-                        cmd = f"python3 /work/{os.path.basename(file_url)}"
-                        code_result = _run_in_docker('devarena/python-runner:latest', cmd, tmpdir, 8)
-                    except FileNotFoundError:
-                        # docker cli not present; run locally
-                        code_result = _safe_run(["python3", file_url], input_data=input_data, timeout=5)
-                    # For python, the expected output may be stored in test_case['expected']
-                    # If test case stores an expected output, compare to student stdout
-                    expected = test_case.get('expected')
-                    if expected is not None:
-                        if code_result.stdout.strip() == expected.strip():
-                            results.append({
-                                'submission_id': submission_id,
-                                'test_case_id': test_case['id'],
-                                'name': test_case.get('name'),
-                                'status': 'passed',
-                                'passed': True
-                            })
-                        else:
-                            results.append({
-                                'submission_id': submission_id,
-                                'test_case_id': test_case['id'],
-                                'name': test_case.get('name'),
-                                'status': 'failed',
-                                'passed': False,
-                                'actual_output': code_result.stdout
-                            })
-                    else:
-                        # No expected field; store stdout as result
-                        results.append({
-                            'submission_id': submission_id,
-                            'test_case_id': test_case['id'],
-                            'name': test_case.get('name'),
-                            'status': 'passed',
-                            'passed': True,
-                            'actual_output': code_result.stdout
-                        })
-
-                elif language == 'C':
-                    # compile and run inside Docker gcc image
-                    try:
-                        # copy file into tmpdir (worker already has file_url on host)
-                        host_submission = file_url
-                        host_dest = os.path.join(tmpdir, os.path.basename(file_url))
-                        shutil.copy(host_submission, host_dest)
-                        # compile inside container
-                        compile_cmd = f"gcc /work/{os.path.basename(host_dest)} -o /work/{submission_id}"
-                        compiled = _run_in_docker('devarena/c-runner:latest', compile_cmd, tmpdir, 12)
-                        if compiled.returncode != 0:
-                            results.append({
-                                'submission_id': submission_id,
-                                'test_case_id': test_case['id'],
-                                'name': test_case.get('name'),
-                                'status': 'failed',
-                                'passed': False,
-                                'actual_output': compiled.stderr
-                            })
-                            continue
-                        run_cmd = f"/work/{submission_id}"
-                        code_result = _run_in_docker('devarena/c-runner:latest', run_cmd, tmpdir, 6)
-                    except FileNotFoundError:
-                        # fallback to local compile/run
-                        exe_path = os.path.join(tmpdir, f"{submission_id}")
-                        compiled = _safe_run(["gcc", file_url, "-o", exe_path], timeout=10)
-                        if compiled.returncode != 0:
-                            results.append({
-                                'submission_id': submission_id,
-                                'test_case_id': test_case['id'],
-                                'name': test_case.get('name'),
-                                'status': 'failed',
-                                'passed': False,
-                                'actual_output': compiled.stderr
-                            })
-                            continue
-                        code_result = _safe_run([exe_path], input_data=input_data, timeout=5)
-                    expected = test_case.get('expected')
-                    if expected is not None and code_result.stdout.strip() == expected.strip():
-                        results.append({
-                            'submission_id': submission_id,
-                            'test_case_id': test_case['id'],
-                            'name': test_case.get('name'),
-                            'status': 'passed',
-                            'passed': True
-                        })
-                    else:
-                        results.append({
-                            'submission_id': submission_id,
-                            'test_case_id': test_case['id'],
-                            'name': test_case.get('name'),
-                            'status': 'failed',
-                            'passed': False,
-                            'actual_output': code_result.stdout if code_result else compiled.stderr
-                        })
-
-                else:
-                    # Unsupported language for now; mark as failed
-                    results.append({
-                        'submission_id': submission_id,
-                        'test_case_id': test_case['id'],
-                        'name': test_case.get('name'),
-                        'status': 'failed',
-                        'passed': False,
-                        'actual_output': 'unsupported language'
-                    })
-
-            except subprocess.TimeoutExpired:
-                results.append({
-                    'submission_id': submission_id,
-                    'test_case_id': test_case['id'],
-                    'name': test_case.get('name'),
-                    'status': 'failed',
-                    'passed': False,
-                    'actual_output': 'timeout'
-                })
-            except Exception as e:
-                results.append({
-                    'submission_id': submission_id,
-                    'test_case_id': test_case['id'],
-                    'name': test_case.get('name'),
-                    'status': 'failed',
-                    'passed': False,
-                    'actual_output': str(e)
-                })
-
-        # persist results
-        failed = False
-        for res in results:
-            if res.get('status') == 'failed':
-                failed = True
-            new_tr = TestResult(**res)
-            new_tr.save()
-
-        if failed:
+                key = _result_key(source, language, task_id, test_case_list)
+            except Exception:
+                key = None
+            if key is not None:
+                cached = _cached_results(key, submission_id)
+
+        if cached is not None:
+            results = cached
+            report(results)
+        elif spec is None:
+            # Unsupported language for now; mark as failed
+            results = [_result(submission_id, task_id, test_case, False,
+                               'unsupported language')
+                       for test_case in test_case_list]
+            report(results)
+        else:
+            pool = get_pool()
+            with pool.sandbox(spec['image']) as sandbox:
+                shutil.copy(file_url,
+                            os.path.join(sandbox.workdir, spec['source']))
+
+                start = time.monotonic()
+                build_error = _build(spec, sandbox)
+                compile_time = time.monotonic() - start
+
+                if build_error is not None:
+                    # one failed build fails every case
+                    results = [_result(submission_id, task_id, test_case,
+                                       False, build_error,
+                                       transient=build_error ==
+                                       'compile timeout')
+                               for test_case in test_case_list]
+                    report(results)
+                elif test_case_list:
+                    start = time.monotonic()
+                    results = _run_parallel(pool, spec, sandbox,
+                                            submission_id, task_id,
+                                            test_case_list, report)
+                    run_time = time.monotonic() - start
+            transient = [res.pop('transient', False) for res in results]
+            if key is not None and not any(transient):
+                _store_results(key, results)
+
+        # persist results and the submission outcome in one transaction
+        points = {test_case['id']: test_case.get('points') or 0
+                  for test_case in test_case_list}
+        passed = [res for res in results if res.get('passed')]
+        storage.bulk_new(TestResult(**res) for res in results)
+
+        if len(passed) < len(results):
             setattr(submission, 'status', 'failed')
         else:
             setattr(submission, 'status', 'passed')
+        submission.passed_tests = len(passed)
+        submission.score = sum(int(points[res['test_case_id']])
+                               for res in passed)
 
         storage.save()
-        return {'status': 'done', 'results': len(results)}
+        return {'status': 'done', 'results': len(results),
+                'cached': cached is not None,
+                'compile_time': round(compile_time, 3),
+                'run_time': round(run_time, 3)}
 
     finally:
-        # cleanup temporary directory
-        try:
-            shutil.rmtree(tmpdir)
-        except Exception:
-            pass
+        # the worker is long-lived; drop this job's session state
+        storage.close()
@@ -0,0 +1,32 @@
+#!/bin/sh
+# Runs every test case of a grading job in one sandbox invocation.
+#
+# usage: sh harness.sh TIMEOUT COUNT CMD
+#
+# Case i reads cases/i.in. Its stdout, stderr, exit code and wall time in
+# milliseconds are written to out/i.out, out/i.err, out/i.rc and out/i.ms.
+# The cases run one after another, each limited to TIMEOUT seconds. Once
+# all are done one "i rc ms" line per case is printed, in case order.
+TIMEOUT=$1
+COUNT=$2
+shift 2
+CMD=$*
+
+mkdir -p out
+
+i=0
+while [ "$i" -lt "$COUNT" ]; do
+    start=$(date +%s%N)
+    timeout -k 1 "$TIMEOUT" sh -c "$CMD" \
+        < "cases/$i.in" > "out/$i.out" 2> "out/$i.err"
+    echo $? > "out/$i.rc"
+    end=$(date +%s%N)
+    echo $(( (end - start) / 1000000 )) > "out/$i.ms"
+    i=$((i + 1))
+done
+
+i=0
+while [ "$i" -lt "$COUNT" ]; do
+    echo "$i $(cat "out/$i.rc") $(cat "out/$i.ms")"
+    i=$((i + 1))
+done
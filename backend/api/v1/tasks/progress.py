@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Grading job progress events.
+
+The grader publishes the progress of a job as a sequence of events:
+
+    queued        the job was enqueued (published by the API)
+    running       a worker picked it up
+    test-passed   one test case passed (data: the test result)
+    test-failed   one test case failed (data: the test result)
+    done          grading finished (data: the job's return value)
+    error         grading crashed
+
+Every event is appended to the Redis list grading:events:<job_id>, kept
+for HISTORY_TTL seconds, and published on grading:progress:<job_id>.
+The position in the list is the event's sequence number, so a client
+that reconnects can ask for the events after the last one it saw.
+
+API processes do not subscribe per client: a ProgressHub runs a single
+listener thread on the grading:progress:* pattern and fans the events
+out to the in-process queues of the clients following each job.
+"""
+import json
+import queue
+import sys
+import threading
+import time
+
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
+
+from api.v1.caching.connection import get_blocking_redis
+
+CHANNEL_PREFIX = "grading:progress:"
+HISTORY_PREFIX = "grading:events:"
+HISTORY_TTL = 3600
+# seconds an SSE stream stays open; the client reconnects with
+# Last-Event-ID and resumes
+STREAM_MAX_SECONDS = 300
+TERMINAL = ("done", "error")
+
+
+def publish(redis_conn, job_id, event, data=None):
+    """Record an event of job_id and publish it to live followers."""
+    if job_id is None:
+        return
+    message = {"event": event, "data": data}
+    history = HISTORY_PREFIX + job_id
+    try:
+        seq = redis_conn.rpush(history, json.dumps(message, default=str))
+        message["seq"] = seq
+        redis_conn.pipeline(transaction=False) \
+            .expire(history, HISTORY_TTL) \
+            .publish(CHANNEL_PREFIX + job_id,
+                     json.dumps(message, default=str)) \
+            .execute()
+    except Exception as e:
+        # progress is best effort; never fail a grading job over it
+        print("Failed to publish grading progress:", str(e))
+
+
+def submission_of(redis_conn, job_id):
+    """Id of the submission job_id grades, from RQ or else from its
+    first events, which carry it; None if the job is unknown."""
+    try:
+        return Job.fetch(job_id, connection=redis_conn).args[0]
+    except NoSuchJobError:
+        pass
+    for raw in redis_conn.lrange(HISTORY_PREFIX + job_id, 0, 1):
+        data = json.loads(raw).get("data") or {}
+        if data.get("submission_id"):
+            return data["submission_id"]
+    return None
+
+
+def history(redis_conn, job_id, after=0):
+    """Events of job_id with a sequence number above after."""
+    events = []
+    for seq, raw in enumerate(
+            redis_conn.lrange(HISTORY_PREFIX + job_id, after, -1),
+            start=after + 1):
+        message = json.loads(raw)
+        message["seq"] = seq
+        events.append(message)
+    return events
+
+
+class ProgressHub:
+    """Fans grading progress out to the followers of each job."""
+
+    def __init__(self, redis_conn):
+        """Create a hub; the listener starts with the first follower."""
+        self.redis_conn = redis_conn
+        self._followers = {}
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def follow(self, job_id):
+        """Return a queue receiving the live events of job_id."""
+        follower = queue.Queue()
+        with self._lock:
+            self._followers.setdefault(job_id, set()).add(follower)
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self._listen, name="grading-progress",
+                    daemon=True)
+                self._listener.start()
+        return follower
+
+    def unfollow(self, job_id, follower):
+        """Stop delivering events of job_id to follower."""
+        with self._lock:
+            followers = self._followers.get(job_id)
+            if followers is not None:
+                followers.discard(follower)
+                if not followers:
+                    del self._followers[job_id]
+
+    def followers(self):
+        """Number of followers per job."""
+        with self._lock:
+            return {job_id: len(f) for job_id, f in self._followers.items()}
+
+    def _dispatch(self, channel, data):
+        """Hand one published event to the followers of its job."""
+        if isinstance(channel, bytes):
+            channel, data = channel.decode(), data.decode()
+        job_id = channel[len(CHANNEL_PREFIX):]
+        with self._lock:
+            followers = list(self._followers.get(job_id, ()))
+        if followers:
+            message = json.loads(data)
+            for follower in followers:
+                follower.put(message)
+
+    def _listen(self):
+        """Receive every job's events, forever."""
+        while True:
+            try:
+                pubsub = get_blocking_redis().pubsub(
+                    ignore_subscribe_messages=True)
+                pubsub.psubscribe(CHANNEL_PREFIX + "*")
+                for message in pubsub.listen():
+                    self._dispatch(message["channel"], message["data"])
+            except Exception as e:
+                print(f"Grading progress listener error: {e}",
+                      file=sys.stderr)
+                time.sleep(1)
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub(redis_conn):
+    """Return the process-wide progress hub."""
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = ProgressHub(redis_conn)
+        return _hub
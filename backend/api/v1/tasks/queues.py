@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Grading queues per language and priority.
+
+Jobs are enqueued on grading_<language>_<priority>, for example
+grading_c_exam. Workers can be dedicated to languages so slow C
+compiles do not hold up quick Python checks, and practice runs do not
+hold up exam submissions. Priorities:
+
+    exam    the project or task is an exam, or its deadline is less
+            than GRADER_DEADLINE_WINDOW seconds away (default 6 hours)
+    normal  everything else
+    bulk    regrades and other bulk submissions
+
+Workers (see worker.py) consume their queues in a weighted random
+priority order drawn again after every job, so exam jobs are taken
+first most of the time (two times in three with the default weights)
+but normal and bulk jobs are never starved. The weights come from
+GRADER_QUEUE_WEIGHTS (default exam=8,normal=3,bulk=1).
+
+The original single `grading` queue is still consumed, at normal
+priority, so jobs enqueued before the split are not lost.
+"""
+import os
+import random
+from datetime import datetime
+
+from models.base_model import time as time_format
+
+PRIORITIES = ('exam', 'normal', 'bulk')
+EXAM_TYPES = ('exam', 'test', 'assessment', 'quiz')
+LEGACY_QUEUE = 'grading'
+WAIT_PREFIX = 'grading:wait:'
+DEADLINE_WINDOW = int(os.getenv('GRADER_DEADLINE_WINDOW', 6 * 3600))
+
+
+def _weights():
+    """Priority weights parsed from GRADER_QUEUE_WEIGHTS."""
+    weights = {'exam': 8, 'normal': 3, 'bulk': 1}
+    for item in os.getenv('GRADER_QUEUE_WEIGHTS', '').split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() in weights and weight.strip():
+            weights[name.strip()] = float(weight)
+    return weights
+
+
+WEIGHTS = _weights()
+
+
+def queue_name(language, priority):
+    """Name of the queue of language and priority."""
+    return f"grading_{str(language).lower()}_{priority}"
+
+
+def priority_of(name):
+    """Priority of a queue name; the legacy queue counts as normal."""
+    priority = name.rsplit('_', 1)[-1]
+    return priority if priority in PRIORITIES else 'normal'
+
+
+def queue_names(languages, priorities=PRIORITIES):
+    """Every queue of languages and priorities, most urgent first, plus
+    the legacy queue."""
+    names = [queue_name(language, priority)
+             for priority in priorities for language in languages]
+    return names + [LEGACY_QUEUE]
+
+
+def _deadline(project):
+    """The project's deadline as a datetime, or None."""
+    deadline = getattr(project, 'deadline', None)
+    if isinstance(deadline, str) and deadline:
+        try:
+            deadline = datetime.strptime(deadline, time_format)
+        except ValueError:
+            return None
+    return deadline if isinstance(deadline, datetime) else None
+
+
+def choose_priority(project, task, regrade=False):
+    """Priority of a grading job for task of project."""
+    if regrade:
+        return 'bulk'
+    kinds = (str(getattr(project, 'project_type', '') or '').lower(),
+             str(getattr(task, 'type', '') or '').lower())
+    if any(kind in EXAM_TYPES for kind in kinds):
+        return 'exam'
+    deadline = _deadline(project)
+    if deadline is not None:
+        remaining = (deadline - datetime.utcnow()).total_seconds()
+        if 0 <= remaining <= DEADLINE_WINDOW:
+            return 'exam'
+    return 'normal'
+
+
+def resolve_language(language, languages):
+    """The name in languages matching language regardless of case, or
+    None; only the languages workers grade have queues."""
+    names = {str(name).lower(): name for name in languages}
+    return names.get(str(language).lower()) if language else None
+
+
+def choose_queue(language, project, task, regrade=False):
+    """Name of the queue a grading job should go to; language is one
+    returned by resolve_language()."""
+    return queue_name(language, choose_priority(project, task, regrade))
+
+
+def weighted_order(queues):
+    """Queues reordered by a weighted random draw of their priorities.
+
+    Priorities are drawn without replacement, each with probability
+    proportional to its weight among those left; queues keep their
+    relative order within a priority.
+    """
+    by_priority = {}
+    for queue in queues:
+        by_priority.setdefault(priority_of(queue.name), []).append(queue)
+    left = list(by_priority)
+    ordered = []
+    while left:
+        weights = [WEIGHTS.get(priority, 1) for priority in left]
+        priority = random.choices(left, weights=weights)[0]
+        left.remove(priority)
+        ordered.extend(by_priority[priority])
+    return ordered
+
+
+def record_wait(connection, queue, job):
+    """Add the time job spent in queue to the queue's wait statistics."""
+    if job.enqueued_at is None:
+        return
+    waited = (datetime.utcnow() -
+              job.enqueued_at.replace(tzinfo=None)).total_seconds()
+    key = WAIT_PREFIX + queue.name
+    connection.pipeline(transaction=False) \
+        .hincrbyfloat(key, 'total', waited) \
+        .hincrby(key, 'jobs', 1) \
+        .hset(key, 'last', waited) \
+        .execute()
+
+
+def queue_stats(queues):
+    """Depth, wait time of the oldest waiting job, and average and last
+    wait of the jobs already taken, per queue."""
+    now = datetime.utcnow()
+    stats = {}
+    for queue in queues:
+        waits = {k.decode() if isinstance(k, bytes) else k: float(v)
+                 for k, v in queue.connection.hgetall(
+                     WAIT_PREFIX + queue.name).items()}
+        oldest = None
+        for job_id in queue.get_job_ids(0, 1):
+            job = queue.fetch_job(job_id)
+            if job is not None and job.enqueued_at is not None:
+                enqueued_at = job.enqueued_at.replace(tzinfo=None)
+                oldest = round((now - enqueued_at).total_seconds(), 3)
+        jobs = int(waits.get('jobs', 0))
+        stats[queue.name] = {
+            'priority': priority_of(queue.name),
+            'depth': queue.count,
+            'oldest_wait': oldest,
+            'jobs_taken': jobs,
+            'average_wait': round(waits['total'] / jobs, 3) if jobs else None,
+            'last_wait': waits.get('last'),
+        }
+    return stats
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""Warm sandbox pool for the grader.
+
+Starting a fresh `docker run --rm` container per command costs hundreds of
+milliseconds before any student code runs. The pool keeps a few locked-down
+runner containers per image running idle (`sleep infinity`) and executes
+commands in them with `docker exec`. Each sandbox has a host workspace
+mounted at /work which is wiped between jobs. Sandboxes are health checked
+when they have been idle for a while and recycled after a number of uses
+or after any command times out, since a timed-out process may still be
+running inside.
+
+The backend is pluggable: `docker` runs real containers, `local` is a
+process-based stand-in that runs commands with the workspace as current
+directory, for development machines and tests without Docker.
+
+Configuration comes from the environment:
+    SANDBOX_BACKEND          docker or local (default: docker if the docker
+                             CLI is installed, local otherwise)
+    SANDBOX_POOL_SIZE        sandboxes per image (default 2)
+    SANDBOX_MAX_USES         jobs served before a sandbox is recycled (50)
+    SANDBOX_HEALTH_INTERVAL  idle seconds before re-checking health (30)
+    SANDBOX_CPUS             CPU limit of each docker sandbox (0.5)
+"""
+import abc
+import atexit
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+SANDBOX_CPUS = float(os.getenv('SANDBOX_CPUS', 0.5))
+SANDBOX_USER = '1000:1000'
+
+# Kills every process of the sandbox user but PID 1 (`sleep infinity`,
+# which the kernel protects) and prints the pids still present, zombies
+# included, other than PID 1 and the shell itself.
+KILL_STRAYS = (
+    'kill -9 -1 2>/dev/null; '
+    'for p in /proc/[0-9]*; do p=${p#/proc/}; '
+    '[ "$p" = 1 ] || [ "$p" = $$ ] || echo "$p"; done'
+)
+
+
+class SandboxError(Exception):
+    """Raised when a sandbox cannot be started or acquired."""
+
+
+class Sandbox(abc.ABC):
+    """A running sandbox with a host workspace mounted at /work."""
+
+    def __init__(self, image):
+        """Start the sandbox for image."""
+        self.image = image
+        self.uses = 0
+        self.broken = False
+        self.last_check = time.monotonic()
+        self.workdir = tempfile.mkdtemp(prefix="sandbox_")
+        # the sandbox user must be able to write build outputs
+        os.chmod(self.workdir, 0o777)
+
+    @abc.abstractmethod
+    def exec(self, cmd, timeout, input_data=None):
+        """Run cmd in /work and return a CompletedProcess.
+
+        Raises subprocess.TimeoutExpired after timeout seconds, in which
+        case the sandbox is marked broken.
+        """
+
+    def reset(self):
+        """Empty the workspace so the next job starts clean."""
+        for name in os.listdir(self.workdir):
+            path = os.path.join(self.workdir, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+    def healthy(self):
+        """True if the sandbox can still run commands."""
+        return not self.broken and os.path.isdir(self.workdir)
+
+    def close(self):
+        """Stop the sandbox and remove its workspace."""
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class LocalSandbox(Sandbox):
+    """Process-based stand-in: runs commands directly on the host."""
+
+    def exec(self, cmd, timeout, input_data=None):
+        """Run cmd with sh in the workspace, killing its process group
+        on timeout."""
+        proc = subprocess.Popen(['sh', '-c', cmd], cwd=self.workdir,
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, text=True,
+                                start_new_session=True)
+        try:
+            stdout, stderr = proc.communicate(input_data, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.communicate()
+            raise
+        return subprocess.CompletedProcess(proc.args, proc.returncode,
+                                           stdout, stderr)
+
+
+class DockerSandbox(Sandbox):
+    """Long-lived locked-down runner container driven with docker exec."""
+
+    def __init__(self, image):
+        """Start a detached container for image."""
+        super().__init__(image)
+        started = subprocess.run([
+            'docker', 'run', '-d', '--rm',
+            '--net', 'none',
+            '--pids-limit', '64',
+            '--cpus', str(SANDBOX_CPUS),
+            '--memory', '128m',
+            '--read-only',
+            '--tmpfs', '/tmp',
+            '-v', f"{self.workdir}:/work:rw",
+            '-w', '/work',
+            '--user', SANDBOX_USER,
+            '--cap-drop', 'ALL',
+            image,
+            'sleep infinity'
+        ], capture_output=True, text=True, timeout=30)
+        if started.returncode != 0:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+            raise SandboxError(started.stderr.strip())
+        self.container_id = started.stdout.strip()
+
+    def exec(self, cmd, timeout, input_data=None):
+        """Run cmd in the container with docker exec."""
+        try:
+            return subprocess.run(
+                ['docker', 'exec', '-i', self.container_id, 'sh', '-c', cmd],
+                capture_output=True, text=True, input=input_data,
+                timeout=timeout)
+        except subprocess.TimeoutExpired:
+            # the process keeps running inside the container
+            self.broken = True
+            raise
+
+    def reset(self):
+        """Kill whatever student code left running, then empty the
+        workspace from inside the container, which owns the files written
+        by student code.
+
+        A process that survives the kill, or is left unreaped, would run
+        alongside the next student's jobs, so the sandbox is marked
+        broken and recycled instead.
+        """
+        killed = subprocess.run(
+            ['docker', 'exec', '-u', SANDBOX_USER, self.container_id,
+             'sh', '-c', KILL_STRAYS],
+            capture_output=True, text=True, timeout=10)
+        if killed.returncode != 0 or killed.stdout.strip():
+            self.broken = True
+            return
+        cleaned = subprocess.run(
+            ['docker', 'exec', '-u', SANDBOX_USER, self.container_id,
+             'find', '/work', '-mindepth', '1', '-delete'],
+            capture_output=True, text=True, timeout=10)
+        if cleaned.returncode != 0:
+            self.broken = True
+
+    def healthy(self):
+        """True if the container is still running."""
+        if self.broken:
+            return False
+        inspected = subprocess.run(
+            ['docker', 'inspect', '-f', '{{.State.Running}}',
+             self.container_id],
+            capture_output=True, text=True, timeout=10)
+        return inspected.stdout.strip() == 'true'
+
+    def close(self):
+        """Remove the container and its workspace."""
+        subprocess.run(['docker', 'rm', '-f', self.container_id],
+                       capture_output=True, text=True, timeout=30)
+        super().close()
+
+
+BACKENDS = {
+    'docker': DockerSandbox,
+    'local': LocalSandbox,
+}
+
+
+class SandboxPool:
+    """Bounded pool of warm sandboxes per image."""
+
+    def __init__(self, backend=None, size=None, max_uses=None,
+                 health_interval=None):
+        """Create an empty pool; sandboxes start on demand or on warm()."""
+        if backend is None:
+            backend = os.getenv('SANDBOX_BACKEND') or \
+                ('docker' if shutil.which('docker') else 'local')
+        if isinstance(backend, str):
+            backend = BACKENDS[backend]
+        self.backend = backend
+        self.size = size or int(os.getenv('SANDBOX_POOL_SIZE', 2))
+        self.max_uses = max_uses or int(os.getenv('SANDBOX_MAX_USES', 50))
+        if health_interval is None:
+            health_interval = float(os.getenv('SANDBOX_HEALTH_INTERVAL', 30))
+        self.health_interval = health_interval
+        self._idle = {}
+        self._started = {}
+        self._lock = threading.Lock()
+        self._recycled = 0
+
+    def _idle_queue(self, image):
+        """Return the idle queue of image, creating it if needed."""
+        with self._lock:
+            if image not in self._idle:
+                self._idle[image] = queue.LifoQueue()
+                self._started[image] = 0
+            return self._idle[image]
+
+    def _start(self, image):
+        """Start a new sandbox if image is under its size limit."""
+        with self._lock:
+            if self._started[image] >= self.size:
+                return None
+            self._started[image] += 1
+        try:
+            return self.backend(image)
+        except Exception:
+            with self._lock:
+                self._started[image] -= 1
+            raise
+
+    def _discard(self, sandbox):
+        """Close a sandbox and free its slot."""
+        try:
+            sandbox.close()
+        finally:
+            with self._lock:
+                self._started[sandbox.image] -= 1
+                self._recycled += 1
+
+    def warm(self, images):
+        """Pre-start sandboxes up to the pool size for each image."""
+        for image in images:
+            idle = self._idle_queue(image)
+            while True:
+                sandbox = self._start(image)
+                if sandbox is None:
+                    break
+                idle.put(sandbox)
+
+    def acquire(self, image, timeout=60):
+        """Take a healthy sandbox for image, waiting up to timeout
+        seconds when all of them are busy."""
+        idle = self._idle_queue(image)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                sandbox = idle.get_nowait()
+            except queue.Empty:
+                sandbox = self._start(image)
+                if sandbox is None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise SandboxError(f"no free sandbox for {image}")
+                    try:
+                        sandbox = idle.get(timeout=remaining)
+                    except queue.Empty:
+                        continue
+                else:
+                    return sandbox
+            now = time.monotonic()
+            if now - sandbox.last_check < self.health_interval:
+                return sandbox
+            if sandbox.healthy():
+                sandbox.last_check = now
+                return sandbox
+            self._discard(sandbox)
+
+    def release(self, sandbox):
+        """Give a sandbox back, wiping it or recycling it."""
+        sandbox.uses += 1
+        if not sandbox.broken and sandbox.uses < self.max_uses:
+            try:
+                sandbox.reset()
+            except Exception:
+                sandbox.broken = True
+        if sandbox.broken or sandbox.uses >= self.max_uses:
+            self._discard(sandbox)
+        else:
+            self._idle_queue(sandbox.image).put(sandbox)
+
+    @contextmanager
+    def sandbox(self, image, timeout=60):
+        """Context manager around acquire()/release()."""
+        sandbox = self.acquire(image, timeout=timeout)
+        try:
+            yield sandbox
+        finally:
+            self.release(sandbox)
+
+    def stats(self):
+        """Per-image counts of started and idle sandboxes."""
+        with self._lock:
+            images = {image: {'started': self._started[image],
+                              'idle': self._idle[image].qsize()}
+                      for image in self._idle}
+            return {'backend': self.backend.__name__, 'size': self.size,
+                    'recycled': self._recycled, 'images': images}
+
+    def shutdown(self):
+        """Close every idle sandbox."""
+        for image, idle in list(self._idle.items()):
+            while True:
+                try:
+                    sandbox = idle.get_nowait()
+                except queue.Empty:
+                    break
+                self._discard(sandbox)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide sandbox pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool()
+            atexit.register(_pool.shutdown)
+        return _pool
@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+"""
+Negotiated response compression
+
+Responses of at least RESPONSE_COMPRESS_MIN_BYTES (default 1024) with a
+text or JSON body are compressed with brotli when the client accepts it
+and the brotli module is installed, with gzip otherwise. Streamed
+responses (NDJSON exports) are left alone.
+
+A compressed response gets its strong ETag suffixed with the encoding
+("<etag>-gzip"), since its bytes differ from the identity response;
+api.v1.utils.conditional accepts those suffixed tags back.
+"""
+import gzip
+import os
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", 5))
+BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", 4))
+COMPRESSIBLE = ("application/json", "text/")
+
+
+def encode(encoding, data):
+    """Compress data with encoding"""
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def negotiate():
+    """Content-Encoding to use for request, or None"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def etag_variants(etag):
+    """Every ETag a response tagged etag may have been sent with"""
+    return [etag, f"{etag}-gzip", f"{etag}-br"]
+
+
+def compress_response(response):
+    """after_request hook compressing response if worthwhile"""
+    if (response.status_code < 200 or response.status_code >= 300
+            or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or not (response.mimetype or "").startswith(COMPRESSIBLE)):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate()
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < MIN_BYTES:
+        return response
+
+    response.set_data(encode(encoding, data))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+
+def init_app(app):
+    """Compress the responses of app"""
+    app.after_request(compress_response)
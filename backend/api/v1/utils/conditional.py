@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+"""
+Conditional GET for read endpoints
+
+A view decorated with @conditional(tags...) answers with an ETag and a
+Cache-Control header. The ETag is a hash of the request path and query
+string and of the generation counters of the cache tags the response
+depends on (see Cache.cached), which every write to those objects
+bumps, and of the epoch of the Redis dataset, so counters that start
+over after Redis loses its data never match old ETags. It is computed
+before the view runs, from one cache lookup, so a request whose
+If-None-Match still matches gets 304 Not Modified without touching the
+database or encoding any JSON.
+"""
+import functools
+import hashlib
+from flask import make_response, request
+from api.v1.app import cache
+from api.v1.utils.compression import etag_variants
+
+
+def _cache_control(max_age):
+    """Cache-Control value letting clients reuse a response max_age
+    seconds before revalidating"""
+    if max_age:
+        return f"private, max-age={max_age}"
+    return "private, no-cache"
+
+
+def conditional(*tags, max_age=0):
+    """
+    Decorator adding ETag / If-None-Match handling to a GET view.
+
+    tags are str.format templates filled in with the view arguments,
+    e.g. @conditional("project:{project_id}").
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            scopes = [tag.format(**kwargs) for tag in tags]
+            try:
+                epoch, *generations = cache.epoch_generations(scopes)
+            except Exception:
+                # without the counters there is nothing to validate against
+                return view(*args, **kwargs)
+            digest = hashlib.sha1(f"{epoch}\0{request.full_path}".encode())
+            for scope, generation in zip(scopes, generations):
+                digest.update(f"\0{scope}={generation}".encode())
+            etag = digest.hexdigest()
+
+            # a compressed 200 was sent with a suffixed tag
+            matched = [tag for tag in etag_variants(etag)
+                       if request.if_none_match.contains(tag)]
+            if matched:
+                response = make_response("", 304)
+                etag = matched[0]
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = _cache_control(max_age)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+"""
+Per-entity cache entries shared by every endpoint
+
+Each object is cached once, as its to_dict(), under
+"<class name lowercased>:<id>@<generation>", the generation being that
+of its "entity:<class name lowercased>:<id>" tag. List endpoints cache
+only the ids of their objects and hydrate them from these entries, so a
+list costs one MGET on top of its id list and the generations, and an
+update only has to bump one tag.
+A ?fields= projection is applied to the cached dicts, so every
+projection shares the same entries.
+"""
+from models import storage
+from api.v1.app import cache
+from api.v1.utils.fields import project
+
+
+def entity_key(cls):
+    """str.format template of the entity keys of cls"""
+    return cls.__name__.lower() + ":{}"
+
+
+def entity_tag(cls):
+    """str.format template of the tags of the objects of cls"""
+    return "entity:" + entity_key(cls)
+
+
+def hydrate(cls, ids, fields=None):
+    """to_dict(fields) of the objects of cls with the given ids, in order"""
+    def load(missing):
+        objs = storage.get_many(cls, missing)
+        return {obj_id: obj.to_dict() for obj_id, obj in objs.items()}
+    records = cache.hydrate(ids, entity_key(cls), load, tag=entity_tag(cls))
+    if fields is None:
+        return records
+    return [project(record, fields) for record in records]
+
+
+def forget(cls, *ids):
+    """Retire the entity entries of the objects of cls with the given ids
+
+    Called after every write to those objects, along with
+    cache.invalidate() for the lists they are in, so no endpoint serves
+    the old version. The entries are not deleted but moved to a new
+    generation: a reader that loaded an object before the write may
+    still store it afterwards, under a key nobody reads any more.
+    """
+    if ids:
+        cache.invalidate(*(entity_tag(cls).format(obj_id) for obj_id in ids))
@@ -0,0 +1,30 @@
+#!/usr/bin/python3
+"""
+Field projection of model objects
+
+Every read endpoint accepts ?fields=id,name,... to get only those
+fields of each object instead of its whole to_dict(). Fields an object
+does not have are left out, and "__class__" is only returned when asked
+for.
+"""
+from flask import request
+
+# most field names a client can ask for at once
+MAX_FIELDS = 64
+
+
+def requested_fields():
+    """the fields asked for with ?fields=, in order, or None for all"""
+    raw = request.args.get("fields")
+    if not raw:
+        return None
+    fields = dict.fromkeys(field.strip() for field in raw.split(","))
+    fields.pop("", None)
+    return tuple(fields)[:MAX_FIELDS] or None
+
+
+def project(record, fields):
+    """record, a to_dict() output, restricted to fields"""
+    if fields is None:
+        return record
+    return {field: record[field] for field in fields if field in record}
@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+"""
+Keyset pagination and NDJSON streaming for list endpoints
+
+List endpoints keep returning a plain JSON array by default. A client
+can instead ask for:
+
+    ?limit=N[&cursor=C]   one page, as {"results": [...], "next_cursor": C}
+                          where next_cursor is null on the last page
+    ?format=ndjson        every object streamed as one JSON document per
+    (or Accept: application/x-ndjson)  line, fetched page by page
+
+Both honor ?fields= (see fields.py).
+
+Pages are ordered by (created_at, id) and the cursor encodes that pair
+for the last object returned, so the storage seeks to the next page
+instead of counting past an OFFSET.
+"""
+import base64
+from datetime import datetime
+from flask import Response, abort, current_app, jsonify, request, \
+    stream_with_context
+from models import storage
+from api.v1.utils.fields import requested_fields
+from models.base_model import time
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+STREAM_BATCH = 500
+NDJSON = "application/x-ndjson"
+
+
+def encode_cursor(obj):
+    """returns the opaque cursor pointing just after obj"""
+    raw = "{}|{}".format(obj.created_at.strftime(time), obj.id)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """returns the (created_at, id) pair encoded in cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, obj_id = raw.split("|", 1)
+        return datetime.strptime(created_at, time), obj_id
+    except (ValueError, UnicodeDecodeError):
+        abort(400, {'message': 'Invalid cursor'})
+
+
+def wants_stream():
+    """True if the client asked for an NDJSON stream"""
+    if request.args.get("format") == "ndjson":
+        return True
+    return request.accept_mimetypes.best == NDJSON
+
+
+def _limit():
+    """parses the limit query parameter"""
+    try:
+        limit = int(request.args.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        abort(400, {'message': 'Invalid limit'})
+    if limit < 1:
+        abort(400, {'message': 'Invalid limit'})
+    return min(limit, MAX_LIMIT)
+
+
+def stream(cls, attributes=None):
+    """streams every matching object as NDJSON, one page at a time"""
+    fields = requested_fields()
+
+    def generate():
+        after = None
+        while True:
+            objs = storage.page(cls, attributes, limit=STREAM_BATCH,
+                                after=after)
+            for obj in objs:
+                yield current_app.json.dumps(obj.to_dict(fields)) + "\n"
+            if len(objs) < STREAM_BATCH:
+                break
+            after = (objs[-1].created_at, objs[-1].id)
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON)
+
+
+def paginate(cls, attributes=None):
+    """ serves the paginated or streamed form of a list endpoint
+
+    Returns None when the client asked for neither, so the view can
+    fall back to its plain JSON array.
+    """
+    if wants_stream():
+        return stream(cls, attributes)
+    if "limit" not in request.args and "cursor" not in request.args:
+        return None
+
+    limit = _limit()
+    after = None
+    if request.args.get("cursor"):
+        after = decode_cursor(request.args["cursor"])
+    objs = storage.page(cls, attributes, limit=limit + 1, after=after)
+    next_cursor = None
+    if len(objs) > limit:
+        objs = objs[:limit]
+        next_cursor = encode_cursor(objs[-1])
+    fields = requested_fields()
+    return jsonify({"results": [obj.to_dict(fields) for obj in objs],
+                    "next_cursor": next_cursor})
@@ -9,6 +9,15 @@ from flask import jsonify, abort, request
 from api.v1.views import app_views
 from api.v1.caching.cache import Cache
 from api.v1.app import cache
+from api.v1.utils.entities import forget, hydrate
+from api.v1.utils.pagination import paginate
+from api.v1.utils.fields import requested_fields
+
+
+@cache.cached("courses:ids", tags=("courses",))
+def _course_ids():
+    """Ids of every course"""
+    return [course.id for course in storage.all(Course).values()]
 
 
 @app_views.route("/courses", methods=['GET'],
@@ -17,19 +26,11 @@ def list_all_courses():
     """
     Retrieves the list of all Course objects
     """
-    key = "all_courses"
-    
-    #check cache first
-    cached_courses = cache.get_cache(key)
-    if cached_courses:
-        return jsonify(cached_courses)
-    
-    courses = storage.all(Course).values()
-    courses_list = [course.to_dict() for course in courses]
-    
-    cache.set_cache(key, courses_list)
-    
-    return jsonify(courses_list)
+    page = paginate(Course)
+    if page is not None:
+        return page
+
+    return jsonify(hydrate(Course, _course_ids(), requested_fields()))
 
 
 
@@ -39,21 +40,11 @@ def retrieve_course(course_id):
     """
     Retrieves a Course object
     """
-    key = f"course:{course_id}"
-    
-    #check cache first
-    cached_course = cache.get_cache(key)
-    if cached_course:
-        return jsonify(cached_course)
-    
-    course = storage.get(Course, course_id)
-    if course is None:
+    courses = hydrate(Course, [course_id], requested_fields())
+    if not courses:
         abort(404)
     
-    
-    cache.set_cache(key, course.to_dict())
-    
-    return jsonify(course.to_dict())
+    return jsonify(courses[0])
 
 
 @app_views.route("/courses/<course_id>", methods=['DELETE'],
@@ -68,10 +59,8 @@ def delete_course(course_id):
     course.delete()
     storage.save()
     
-    # remove the course from the cache
-    redis_keys = [f"course:{course_id}", "all_courses"]
-    for key in redis_keys:
-        cache.delete_cache(key)
+    cache.invalidate("courses", f"course:{course_id}")
+    forget(Course, course_id)
     
     return jsonify({}), 200
 
@@ -96,10 +85,7 @@ def create_course():
     new_course = Course(**req)
     new_course.save()
     
-    # Cache the new course for 5 minutes
-    cache.delete_cache("all_courses")
-    redis_key = f"course:{new_course.id}"
-    cache.set_cache(redis_key, new_course.to_dict())
+    cache.invalidate("courses")
 
     return jsonify(new_course.to_dict()), 201
 
@@ -125,9 +111,7 @@ def update_course(course_id):
             setattr(course, k, v)
     storage.save()
     
-    # Update the cache for 5 minutes with the updated course
-    cache.delete_cache("all_courses")
-    redis_key = f"course:{course_id}"
-    cache.set_cache(redis_key, course.to_dict())
+    cache.invalidate("courses")
+    forget(Course, course_id)
     
     return jsonify(course.to_dict()), 200
@@ -5,6 +5,7 @@ Endpoints to save and retrieve inline editor drafts per user and task.
 """
 from flask import jsonify, abort, request
 from api.v1.views import app_views
+from api.v1.utils.fields import requested_fields
 from models import storage
 from models.draft import Draft
 
@@ -16,10 +17,10 @@ def get_draft(task_id):
     if user is None:
         abort(404)
 
-    drafts = storage.all(Draft).values()
-    for d in drafts:
-        if getattr(d, 'task_id', None) == task_id and getattr(d, 'user_id', None) == user.id:
-            return jsonify(d.to_dict())
+    drafts = storage.search(Draft, {'user_id': user.id, 'task_id': task_id},
+                            limit=1)
+    if drafts:
+        return jsonify(drafts[0].to_dict(requested_fields()))
 
     return jsonify({}), 200
 
@@ -42,12 +43,9 @@ def save_draft(task_id):
         return abort(400, {'message': 'Missing code'})
 
     # find existing draft
-    drafts = storage.all(Draft).values()
-    existing = None
-    for d in drafts:
-        if getattr(d, 'task_id', None) == task_id and getattr(d, 'user_id', None) == user.id:
-            existing = d
-            break
+    drafts = storage.search(Draft, {'user_id': user.id, 'task_id': task_id},
+                            limit=1)
+    existing = drafts[0] if drafts else None
 
     if existing:
         existing.code = code
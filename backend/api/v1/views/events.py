@@ -7,50 +7,45 @@ from models.event import Event
 from flask import jsonify, abort, request
 from api.v1.views import app_views
 from api.v1.app import cache
+from api.v1.utils.conditional import conditional
+from api.v1.utils.entities import forget, hydrate
+from api.v1.utils.pagination import paginate
+from api.v1.utils.fields import requested_fields
+
+
+@cache.cached("events:ids", tags=("events",))
+def _event_ids():
+    """Ids of every event"""
+    return [event.id for event in storage.all(Event).values()]
 
 
 @app_views.route("/events", methods=['GET'],
                  strict_slashes=False)
+@conditional("events", max_age=60)
 def list_all_events():
     """
     Retrieves the list of all Level objects
     """
-    redis_key = "all_events"
-    
-    # Check Redis cache first
-    cached_levels = cache.get_cache(redis_key)
-    if cached_levels:
-        return jsonify(cached_levels)
-    events = storage.all(Event).values()
-    events_list = [event.to_dict() for event in events]
-    
-    # Cache the list of events in Redis for 5 minutes
-    cache.set_cache(redis_key, events_list)
-    
-    return jsonify(events_list)
+    page = paginate(Event)
+    if page is not None:
+        return page
+
+    return jsonify(hydrate(Event, _event_ids(), requested_fields()))
 
 
 
 @app_views.route("/events/<event_id>", methods=['GET'],
                  strict_slashes=False)
+@conditional("events", max_age=60)
 def retrieve_event(event_id):
     """
     Retrieves a Event object
     """
-    redis_key = f"event:{event_id}"
-    
-    # Check Redis cache first
-    cached_event = cache.get_cache(redis_key)
-    if cached_event:
-        return jsonify(cached_event)
-    event = storage.get(Event, event_id)
-    if event is None:
+    events = hydrate(Event, [event_id], requested_fields())
+    if not events:
         abort(404)
-        
-    # Store event data in Redis (cache it) for future requests
-    cache.set_cache(redis_key, event.to_dict())
     
-    return jsonify(event.to_dict())
+    return jsonify(events[0])
 
 
 @app_views.route("/events/<event_id>", methods=['DELETE'],
@@ -65,10 +60,8 @@ def delete_event(event_id):
     event.delete()
     storage.save()
     
-    # remove the event from the cache
-    redis_keys = [f"user:{event_id}", "all_events"]
-    for key in redis_keys:
-        cache.delete_cache(key)
+    cache.invalidate("events")
+    forget(Event, event_id)
 
     return jsonify({}), 200
 
@@ -93,10 +86,7 @@ def create_event():
     new_event = Event(**req)
     new_event.save()
     
-    # Cache the new event for 5 minutes
-    cache.delete_cache("all_events")
-    redis_key = f"event:{new_event.id}"
-    cache.set_cache(redis_key, new_event.to_dict())
+    cache.invalidate("events")
 
     return jsonify(new_event.to_dict()), 201
 
@@ -122,9 +112,7 @@ def update_event(event_id):
             setattr(event, k, v)
     storage.save()
     
-    # Update the cache for 5 minutes with the updated event
-    cache.delete_cache("all_events")
-    redis_key = f"event:{event_id}"
-    cache.set_cache(redis_key, event.to_dict())
+    cache.invalidate("events")
+    forget(Event, event_id)
     
     return jsonify(event.to_dict()), 200
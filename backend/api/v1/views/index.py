@@ -12,6 +12,8 @@ from models.test_case import TestCase
 from models.event import Event
 from flask import jsonify, abort
 from api.v1.views import app_views
+from api.v1.app import cache
+from api.v1.caching.connection import get_redis, pool_stats
 
 
 @app_views.route("/status", strict_slashes=False)
@@ -36,6 +38,48 @@ def stats():
         "events": storage.count(Event),
         })
 
+
+@app_views.route("/stats/cache", strict_slashes=False)
+def cache_stats():
+    """
+    endpoint that reports the cache hit and miss counters of this process
+    """
+    return jsonify(cache.stats())
+
+
+@app_views.route("/stats/redis", strict_slashes=False)
+def redis_stats():
+    """
+    endpoint that reports the Redis connection pool usage of this process
+    """
+    return jsonify(pool_stats())
+
+
+@app_views.route("/stats/storage", strict_slashes=False)
+def storage_stats():
+    """
+    endpoint that reports the size and memory overhead of the file
+    storage class dicts and indexes
+    """
+    if not hasattr(storage, "index_stats"):
+        abort(404)
+    return jsonify(storage.index_stats())
+
+
+@app_views.route("/stats/queues", strict_slashes=False)
+def queue_stats():
+    """
+    endpoint that reports the depth and wait times of the grading queues
+    """
+    from rq import Queue
+    from api.v1.tasks import queues
+    from api.v1.tasks.grader import LANGUAGES
+
+    redis_conn = get_redis()
+    names = queues.queue_names([name.lower() for name in LANGUAGES])
+    return jsonify(queues.queue_stats(
+        [Queue(name, connection=redis_conn) for name in names]))
+
 @app_views.route('/unauthorized', methods=['GET'], strict_slashes=False)
 def unauthorized_error() -> None:
     """ GET /api/v1/unauthorized
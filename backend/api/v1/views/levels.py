@@ -7,52 +7,44 @@ from models.level import Level
 from flask import jsonify, abort, request
 from api.v1.views import app_views
 from api.v1.app import cache
+from api.v1.utils.conditional import conditional
+from api.v1.utils.entities import forget, hydrate
+from api.v1.utils.pagination import paginate
+from api.v1.utils.fields import requested_fields
+
+
+@cache.cached("levels:ids", tags=("levels",))
+def _level_ids():
+    """Ids of every level"""
+    return [level.id for level in storage.all(Level).values()]
 
 
 @app_views.route("/levels", methods=['GET'],
                  strict_slashes=False)
+@conditional("levels", max_age=300)
 def list_all_levels():
     """
     Retrieves the list of all Level objects
     """
-    redis_key = "all_levels"
-    
-    # Check Redis cache first
-    cached_levels = cache.get_cache(redis_key)
-    if cached_levels:
-        return jsonify(cached_levels)
-    
-    # If not cached, fetch all levels from the database
-    levels = storage.all(Level).values()
-    levels_list = [level.to_dict() for level in levels]
-    
-    # Cache the list of levels in Redis for 5 minutes
-    cache.set_cache(redis_key, levels_list)
-    
-    return jsonify(levels_list)
+    page = paginate(Level)
+    if page is not None:
+        return page
+
+    return jsonify(hydrate(Level, _level_ids(), requested_fields()))
 
 
 @app_views.route("/levels/<level_id>", methods=['GET'],
                  strict_slashes=False)
+@conditional("levels", max_age=300)
 def retrieve_level(level_id):
     """
     Retrieves a Level object
     """
-    redis_key = f"level:{level_id}"
-    
-    # Check Redis cache first
-    cached_level = cache.get_cache(redis_key)
-    if cached_level:
-        return jsonify(cached_level)
-    
-    level = storage.get(Level, level_id)
-    if level is None:
+    levels = hydrate(Level, [level_id], requested_fields())
+    if not levels:
         abort(404)
     
-    # Store level data in Redis (cache it) for future requests
-    cache.set_cache(redis_key, level.to_dict())
-    
-    return jsonify(level.to_dict())
+    return jsonify(levels[0])
 
 
 @app_views.route("/levels/<level_id>", methods=['DELETE'],
@@ -67,10 +59,8 @@ def delete_level(level_id):
     level.delete()
     storage.save()
     
-    # remove the level from the cache
-    redis_keys = [f"level:{level_id}", "all_levels"]
-    for key in redis_keys:
-        cache.delete_cache(key)
+    cache.invalidate("levels")
+    forget(Level, level_id)
     
     return jsonify({}), 200
 
@@ -95,10 +85,7 @@ def create_level():
     new_level = Level(**req)
     new_level.save()
     
-    # Cache the new level for 5 minutes
-    cache.delete_cache("all_levels")
-    redis_key = f"level:{new_level.id}"
-    cache.set_cache(redis_key, new_level.to_dict())
+    cache.invalidate("levels")
 
     return jsonify(new_level.to_dict()), 201
 
@@ -124,9 +111,7 @@ def update_level(level_id):
             setattr(level, k, v)
     storage.save()
     
-    # Update the cache for 5 minutes with the updated level
-    cache.delete_cache("all_levels")
-    redis_key = f"level:{level_id}"
-    cache.set_cache(redis_key, level.to_dict())
+    cache.invalidate("levels")
+    forget(Level, level_id)
     
     return jsonify(level.to_dict()), 200
@@ -10,6 +10,17 @@ from models.resource import Resource
 from flask import jsonify, abort, request
 from api.v1.views import app_views
 from api.v1.app import cache
+from api.v1.utils.entities import forget, hydrate
+from api.v1.utils.pagination import paginate
+from api.v1.utils.fields import requested_fields
+
+
+@cache.cached("project_ids:course:{course_id}", tags=("course:{course_id}",))
+def _project_ids_under_course(course_id):
+    """Ids of every project of a course"""
+    projects = storage.search(Project, {"course_id": course_id})
+    return [project.id for project in projects]
+
 
 @app_views.route("/courses/<course_id>/projects", methods=['POST'],
                  strict_slashes=False)
@@ -35,10 +46,7 @@ def create_project(course_id):
     new_project = Project(**req)
     new_project.save()
     
-    # Cache the new project for 5 minutes
-    cache.delete_cache("all_projects")
-    redis_key = f"project:{new_project.id}"
-    cache.set_cache(redis_key, new_project.to_dict())
+    cache.invalidate(f"course:{course_id}")
 
     return jsonify(new_project.to_dict()), 201
 
@@ -48,9 +56,13 @@ def list_all_projects():
     """
     Retrieves the list of all Project objects
     """
+    page = paginate(Project)
+    if page is not None:
+        return page
     
     projects = storage.all(Project).values()
-    projects_list = [project.to_dict() for project in projects]
+    fields = requested_fields()
+    projects_list = [project.to_dict(fields) for project in projects]
     
     
     return jsonify(projects_list)
@@ -62,25 +74,16 @@ def projects_under_course(course_id):
     """
     Retrieves the list of all Project objects under a Course
     """
-    redis_key = "all_projects"
-    
-    # Check Redis cache first
-    cached_projects = cache.get_cache(redis_key)
-    if cached_projects:
-        return jsonify(cached_projects)
-    
     courses = storage.get(Course, course_id)
     if courses is None:
         abort(404)
 
-    projects = storage.all(Project).values()
-    projects_list = [project.to_dict() for project in projects if project.course_id == course_id]
-    
-    
-    # Cache the list of projects in Redis for 5 minutes
-    cache.set_cache(redis_key, projects_list)
-    
-    return jsonify(projects_list)
+    page = paginate(Project, {"course_id": course_id})
+    if page is not None:
+        return page
+
+    return jsonify(hydrate(Project, _project_ids_under_course(course_id),
+                           requested_fields()))
 
 
 @app_views.route("/projects/<project_id>", methods=['GET'],
@@ -89,21 +92,11 @@ def retrieve_project(project_id):
     """
     Retrieves a Project object
     """
-    redis_key = f"project:{project_id}"
-    
-    # Check Redis cache first
-    cached_project = cache.get_cache(redis_key)
-    if cached_project:
-        return jsonify(cached_project)
-    
-    project = storage.get(Project, project_id)
-    if project is None:
+    projects = hydrate(Project, [project_id], requested_fields())
+    if not projects:
         abort(404)
     
-    # Store project data in Redis (cache it) for future requests
-    cache.set_cache(redis_key, project.to_dict())
-    
-    return jsonify(project.to_dict())
+    return jsonify(projects[0])
 
 
 @app_views.route("/projects/<project_id>", methods=['DELETE'],
@@ -118,10 +111,8 @@ def delete_project(project_id):
     project.delete()
     storage.save()
     
-    # remove the projects from the cache
-    redis_keys = [f"project:{project_id}", "all_projects"]
-    for key in redis_keys:
-        cache.delete_cache(key)
+    cache.invalidate(f"course:{project.course_id}", f"project:{project_id}")
+    forget(Project, project_id)
     
     return jsonify({}), 200
 
@@ -147,9 +138,7 @@ def update_project(project_id):
             setattr(project, k, v)
     storage.save()
     
-    # Update the cache for 5 minutes with the updated timetable
-    cache.delete_cache("all_projects")
-    redis_key = f"timetable:{project_id}"
-    cache.set_cache(redis_key, project.to_dict())
+    cache.invalidate(f"course:{project.course_id}", f"project:{project_id}")
+    forget(Project, project_id)
     
     return jsonify(project.to_dict()), 200
@@ -8,6 +8,17 @@ from models.resource  import Resource
 from flask import jsonify, abort, request
 from api.v1.views import app_views
 from api.v1.app import cache
+from api.v1.utils.entities import forget, hydrate
+from api.v1.utils.fields import requested_fields
+
+
+@cache.cached("resource_ids:project:{project_id}",
+              tags=("project:{project_id}",))
+def _resource_ids_under_project(project_id):
+    """Ids of every resource of a project"""
+    resources = storage.search(Resource, {"project_id": project_id})
+    return [resource.id for resource in resources]
+
 
 @app_views.route("/projects/<project_id>/resources", methods=['POST'],
                  strict_slashes=False)
@@ -33,8 +44,7 @@ def create_resource(project_id):
     new_resource = Resource(**req)
     new_resource.save()
     
-    # Cache the new task for 5 minutes
-    cache.delete_cache("all_resources")
+    cache.invalidate(f"project:{project_id}")
 
     return jsonify(new_resource.to_dict()), 201
 
@@ -45,27 +55,15 @@ def resource_under_project(project_id):
     """
     Retrieves the list of all Resource objects under a Project
     """
-    redis_key = "all_resources"
-    
-    # Check Redis cache first
-    cached_resources = cache.get_cache(redis_key)
-    if cached_resources:
-        return jsonify(cached_resources)
-    
     projects = storage.get(Project, project_id)
     if projects is None:
         abort(404)
         
-    resources = storage.all(Resource).values()
-    resource_list = [resource.to_dict() for resource in resources if resource.project_id == project_id]
-    
-    # Cache the list of resources in Redis for 5 minutes
-    cache.set_cache(redis_key, resource_list)
-
-    return jsonify(resource_list)
+    return jsonify(hydrate(Resource, _resource_ids_under_project(project_id),
+                           requested_fields()))
 
 
-@app_views.route("/projects/<project_id>/resources/<recource_id>", methods=['GET'],
+@app_views.route("/projects/<project_id>/resources/<resource_id>", methods=['GET'],
                  strict_slashes=False)
 def retrieve_resource(project_id, resource_id):
     """
@@ -75,11 +73,10 @@ def retrieve_resource(project_id, resource_id):
     if projects is None:
         abort(404)
     resource = storage.get(Resource, resource_id)
-    if resource is None:
+    if resource is None or resource.project_id != project_id:
         abort(404)
     
-    resources = storage.all(Resource).values()
-    return jsonify(resources.to_dict())
+    return jsonify(resource.to_dict(requested_fields()))
 
 
 @app_views.route("/projects/<project_id>/resources/<resource_id>", methods=['DELETE'],
@@ -98,7 +95,8 @@ def delete_resource(project_id, resource_id):
     resource.delete()
     storage.save()
     
-    cache.delete_cache("all_resources")
+    cache.invalidate(f"project:{project_id}")
+    forget(Resource, resource_id)
     
     return jsonify({}), 200
 
@@ -128,6 +126,7 @@ def update_resource(project_id, resource_id):
             setattr(resource, k, v)
     storage.save()
     
-    cache.delete_cache("all_resources")
+    cache.invalidate(f"project:{project_id}")
+    forget(Resource, resource_id)
     
     return jsonify(resource.to_dict()), 200
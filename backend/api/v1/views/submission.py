@@ -10,13 +10,19 @@ from models.test_case import TestCase
 from models.test_result import TestResult
 from api.v1.auth.session_auth import SessionAuth
 from models.submission import Submission
-from flask import jsonify, abort, request
+from flask import Response, jsonify, abort, request, stream_with_context
 from api.v1.views import app_views
 from api.v1.app import app
 from werkzeug.utils import secure_filename
 import os
+import queue
+import time
 import subprocess
 from api.v1.app import cache
+from api.v1.utils.pagination import paginate
+from api.v1.tasks import progress, queues
+from api.v1.caching.connection import get_redis
+from api.v1.utils.fields import requested_fields
 
 
 app.config['UPLOAD_FOLDER'] = './uploads'
@@ -134,8 +140,14 @@ def all_submission(project_id):
     if projects is None:
         abort(404)
         
-    submissions = storage.all(Submission).values()
-    submission_list = [submission.to_dict() for submission in submissions if submission.project_id == project_id and submission.student_id == user.id]
+    attributes = {"student_id": user.id, "project_id": project_id}
+    page = paginate(Submission, attributes)
+    if page is not None:
+        return page
+
+    submissions = storage.search(Submission, attributes)
+    fields = requested_fields()
+    submission_list = [submission.to_dict(fields) for submission in submissions]
     
     
     return jsonify(submission_list)
@@ -162,8 +174,15 @@ def retrieve_submission(project_id, task_id):
     if task is None:
         abort(404)
     
-    submissions = storage.all(Submission).values()
-    submission = [submission.to_dict() for submission in submissions if submission.task_id == task_id and submission.project_id == project_id and submission.student_id == user.id]
+    attributes = {"student_id": user.id, "project_id": project_id,
+                  "task_id": task_id}
+    page = paginate(Submission, attributes)
+    if page is not None:
+        return page
+
+    submissions = storage.search(Submission, attributes)
+    fields = requested_fields()
+    submission = [submission.to_dict(fields) for submission in submissions]
     
     
     return jsonify(submission)
@@ -221,10 +240,9 @@ def update_submission(submission_id):
             setattr(submission, k, v)
     storage.save()
     
-    test_results = storage.all(TestResult).values()
+    test_results = storage.search(TestResult, {"submission_id": submission.id})
     for test_result in test_results:
-        if test_result.submission_id == submission.id:
-            test_result.delete()
+        test_result.delete()
     storage.save()
 
     #for k, v in req.items():
@@ -268,29 +286,53 @@ def submission_checker(task_id, submission_id):
     if task is None:
         abort(404, {"message": "Task doesn't exist"})
 
+    from api.v1.tasks.grader import LANGUAGES
+    language = queues.resolve_language(
+        req.get('language') or getattr(task, 'language', None), LANGUAGES)
+    if language is None:
+        abort(400, {'message': 'Unsupported language'})
+
     # Enqueue job using RQ (Redis Queue)
     try:
-        import redis as _redis
         from rq import Queue
         from api.v1.tasks.grader import process_submission
 
-        redis_conn = _redis.StrictRedis(host='localhost', port=6379, decode_responses=True)
-        q = Queue('grading', connection=redis_conn)
-        job = q.enqueue(process_submission, submission_id, task_id, req.get('project_id'), user.id, req.get('language'), submission.file_url)
-        return jsonify({'job_id': job.get_id(), 'status': 'queued'}), 202
+        redis_conn = get_redis()
+        # exam and near-deadline jobs jump the practice runs
+        q = Queue(queues.choose_queue(language, project, task,
+                                      regrade=bool(req.get('regrade'))),
+                  connection=redis_conn)
+        job = q.enqueue(process_submission, submission_id, task_id, req.get('project_id'), user.id, language, submission.file_url)
+        progress.publish(redis_conn, job.get_id(), 'queued',
+                         {'submission_id': submission_id, 'task_id': task_id})
+        return jsonify({'job_id': job.get_id(), 'status': 'queued',
+                        'queue': q.name}), 202
     except Exception as e:
         # If queueing fails, return server error (worker may not be available)
         print("Failed to enqueue grading job:", str(e))
         return abort(500, {"message": "Failed to enqueue grading job"})
 
 
+def _check_job_owner(redis_conn, job_id):
+    """abort unless job_id grades a submission of the current user"""
+    submission_id = progress.submission_of(redis_conn, job_id)
+    if submission_id is None:
+        abort(404, {'message': 'job not found'})
+    from api.v1.app import auth
+    user = auth.current_user(request)
+    submission = storage.get(Submission, submission_id)
+    if user is None or submission is None or \
+            submission.student_id != user.id:
+        abort(403)
+
+
 @app_views.route('/jobs/<job_id>', methods=['GET'], strict_slashes=False)
 def job_status(job_id):
     """Return RQ job status and result metadata."""
+    redis_conn = get_redis()
+    _check_job_owner(redis_conn, job_id)
     try:
-        import redis as _redis
         from rq.job import Job
-        redis_conn = _redis.StrictRedis(host='localhost', port=6379, decode_responses=True)
         job = Job.fetch(job_id, connection=redis_conn)
         data = {
             'id': job.get_id(),
@@ -301,3 +343,82 @@ def job_status(job_id):
         return jsonify(data), 200
     except Exception as e:
         return abort(404, {'message': 'job not found'})
+
+
+def _sse(message):
+    """Format a progress event as a Server-Sent Event"""
+    return (f"id: {message['seq']}\nevent: {message['event']}\n"
+            f"data: {app.json.dumps(message['data'])}\n\n")
+
+
+@app_views.route('/jobs/<job_id>/events', methods=['GET'],
+                 strict_slashes=False)
+def job_events(job_id):
+    """
+    Progress events of a grading job
+
+    With Accept: text/event-stream the events are streamed as
+    Server-Sent Events until the job is done, resuming after the
+    Last-Event-ID header on reconnect. Otherwise this is a long poll:
+    the events after ?after=N are returned as soon as there is at least
+    one, waiting up to ?timeout= seconds (default 25, at most 60).
+    A stream is closed after progress.STREAM_MAX_SECONDS; clients
+    reconnect and resume. Only the owner of the graded submission can
+    read them.
+    """
+    redis_conn = get_redis()
+    _check_job_owner(redis_conn, job_id)
+    hub = progress.get_hub(redis_conn)
+
+    if request.accept_mimetypes.best == "text/event-stream":
+        after = request.headers.get("Last-Event-ID", type=int) or 0
+        # follow before reading the history so nothing falls in between
+        follower = hub.follow(job_id)
+
+        def generate():
+            seen = after
+            deadline = time.monotonic() + progress.STREAM_MAX_SECONDS
+            try:
+                pending = progress.history(redis_conn, job_id, seen)
+                while time.monotonic() < deadline:
+                    for message in pending:
+                        if message["seq"] <= seen:
+                            continue
+                        seen = message["seq"]
+                        yield _sse(message)
+                        if message["event"] in progress.TERMINAL:
+                            return
+                    try:
+                        message = follower.get(timeout=15)
+                    except queue.Empty:
+                        yield ": keep-alive\n\n"
+                        pending = []
+                        continue
+                    if message["seq"] > seen + 1:
+                        # missed some while the listener reconnected
+                        pending = progress.history(redis_conn, job_id, seen)
+                    else:
+                        pending = [message]
+            finally:
+                hub.unfollow(job_id, follower)
+
+        return Response(stream_with_context(generate()),
+                        mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache",
+                                 "X-Accel-Buffering": "no"})
+
+    after = request.args.get("after", 0, type=int)
+    timeout = max(0, min(request.args.get("timeout", 25, type=float), 60))
+    follower = hub.follow(job_id)
+    try:
+        events = progress.history(redis_conn, job_id, after)
+        if not events:
+            try:
+                follower.get(timeout=timeout)
+            except queue.Empty:
+                pass
+            events = progress.history(redis_conn, job_id, after)
+    finally:
+        hub.unfollow(job_id, follower)
+    return jsonify({"events": events,
+                    "next": events[-1]["seq"] if events else after})
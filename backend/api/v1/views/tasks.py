@@ -12,6 +12,8 @@ from api.v1.auth.session_auth import SessionAuth
 from flask import jsonify, abort, request
 from api.v1.views import app_views
 from api.v1.app import cache
+from api.v1.utils.conditional import conditional
+from api.v1.utils.fields import requested_fields
 
 
 @app_views.route("/projects/<project_id>/tasks", methods=['POST'],
@@ -38,12 +40,15 @@ def create_task(project_id):
     new_task = Task(**req)
     new_task.save()
     
+    # the tasks of the project changed
+    cache.invalidate(f"project:{project_id}")
 
     return jsonify(new_task.to_dict()), 201
 
 
 @app_views.route("/projects/<project_id>/tasks", methods=['GET'],
                  strict_slashes=False)
+@conditional("project:{project_id}")
 def tasks_under_project(project_id):
     """
     Retrieves the list of all Task objects under a Project
@@ -54,8 +59,9 @@ def tasks_under_project(project_id):
     if projects is None:
         abort(404)
         
-    tasks = storage.all(Task).values()
-    task_list = [task.to_dict() for task in tasks if task.project_id == project_id]
+    tasks = storage.search(Task, {"project_id": project_id})
+    fields = requested_fields()
+    task_list = [task.to_dict(fields) for task in tasks]
     
 
     return jsonify(task_list)
@@ -63,6 +69,7 @@ def tasks_under_project(project_id):
 
 @app_views.route("/projects/<project_id>/tasks/<task_id>", methods=['GET'],
                  strict_slashes=False)
+@conditional("project:{project_id}")
 def retrieve_task(project_id, task_id):
     """
     Retrieves a Task object
@@ -76,7 +83,7 @@ def retrieve_task(project_id, task_id):
     if task is None:
         abort(404, {"message": "Task doesn't exist"})
     
-    return jsonify(task.to_dict())
+    return jsonify(task.to_dict(requested_fields()))
 
 
 @app_views.route("/tasks/<task_id>", methods=['DELETE'],
@@ -91,12 +98,14 @@ def delete_task(task_id):
     task.delete()
     storage.save()
     
+    cache.invalidate(f"project:{task.project_id}")
+    
     return jsonify({}), 200
 
 
 @app_views.route("/projects/<project_id>/tasks/<task_id>", methods=['PUT'],
                  strict_slashes=False)
-def update_task(task_id):
+def update_task(project_id, task_id):
     """
     Updates a task object
     """
@@ -115,5 +124,6 @@ def update_task(task_id):
             setattr(task, k, v)
     storage.save()
     
+    cache.invalidate(f"project:{task.project_id}")
     
     return jsonify(task.to_dict()), 200
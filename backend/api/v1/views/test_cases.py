@@ -7,6 +7,8 @@ from models.task  import Task
 from models.test_case import TestCase
 from flask import jsonify, abort, request
 from api.v1.views import app_views
+from api.v1.tasks.grader import bump_test_case_version, order_key
+from api.v1.utils.fields import requested_fields
 
 
 @app_views.route("/tasks/<task_id>/test_cases", methods=['POST'],
@@ -32,6 +34,7 @@ def create_test_case(task_id):
 
     new_test_case = TestCase(**req)
     new_test_case.save()
+    bump_test_case_version(task_id)
 
     return jsonify(new_test_case.to_dict()), 201
 
@@ -46,8 +49,11 @@ def test_cases_under_task(task_id):
     if tasks is None:
         abort(404)
         
-    test_cases = storage.all(TestCase).values()
-    test_case_list = [test_case.to_dict() for test_case in test_cases if test_case.task_id == task_id]
+    # order_index is a string column; sort it as the grader runs them
+    test_cases = sorted(storage.search(TestCase, {"task_id": task_id}),
+                        key=lambda test_case: order_key(test_case.order_index))
+    fields = requested_fields()
+    test_case_list = [test_case.to_dict(fields) for test_case in test_cases]
     return jsonify(test_case_list)
 
 
@@ -61,8 +67,7 @@ def retrieve_test_case(test_case_id):
     if test_case is None:
         abort(404)
     
-    test_cases = storage.all(TestCase).values()
-    return jsonify(test_cases.to_dict())
+    return jsonify(test_case.to_dict(requested_fields()))
 
 
 @app_views.route("/test_cases/<test_case_id>", methods=['DELETE'],
@@ -77,6 +82,7 @@ def delete_test_case(test_case_id):
     
     test_case.delete()
     storage.save()
+    bump_test_case_version(test_case.task_id)
     return jsonify({}), 200
 
 
@@ -100,4 +106,5 @@ def update_test_case(test_case_id):
         if k not in check:
             setattr(test_case, k, v)
     storage.save()
+    bump_test_case_version(test_case.task_id)
     return jsonify(test_case.to_dict()), 200
@@ -7,6 +7,7 @@ from models.task  import Task
 from models.test_result import TestResult
 from flask import jsonify, abort, request
 from api.v1.views import app_views
+from api.v1.utils.fields import requested_fields
 
 
 @app_views.route("/tasks/<task_id>/test_results", methods=['GET'],
@@ -20,6 +21,7 @@ def test_results_under_task(task_id):
         print("Task doesn't exist")
         abort(404, {"message": "Task doesn't exist"})
     
-    test_results = storage.all(TestResult).values()
-    test_result_list = [test_result.to_dict() for test_result in test_results if test_result.task_id == task_id]
+    test_results = storage.search(TestResult, {"task_id": task_id})
+    fields = requested_fields()
+    test_result_list = [test_result.to_dict(fields) for test_result in test_results]
     return jsonify(test_result_list)
@@ -7,52 +7,45 @@ from models.timetable import Timetable
 from flask import jsonify, abort, request
 from api.v1.views import app_views
 from api.v1.app import cache
+from api.v1.utils.conditional import conditional
+from api.v1.utils.entities import forget, hydrate
+from api.v1.utils.pagination import paginate
+from api.v1.utils.fields import requested_fields
+
+
+@cache.cached("timetables:ids", tags=("timetables",))
+def _timetable_ids():
+    """Ids of every timetable"""
+    return [timetable.id for timetable in storage.all(Timetable).values()]
 
 
 @app_views.route("/timetables", methods=['GET'],
                  strict_slashes=False)
+@conditional("timetables", max_age=60)
 def list_all_timetables():
     """
     Retrieves the list of all Timetables objects
     """
-    redis_key = "all_timetables"
-    
-    # Check Redis cache first
-    cached_timetables = cache.get_cache(redis_key)
-    if cached_timetables:
-        return jsonify(cached_timetables)
-    
-    timetables = storage.all(Timetable).values()
-    timetables_list = [timetable.to_dict() for timetable in timetables]
-    
-    # Cache the list of timetables in Redis for 5 minutes
-    cache.set_cache(redis_key, timetables_list)
-    
-    return jsonify(timetables_list)
+    page = paginate(Timetable)
+    if page is not None:
+        return page
+
+    return jsonify(hydrate(Timetable, _timetable_ids(), requested_fields()))
 
 
 
 @app_views.route("/timetables/<timetable_id>", methods=['GET'],
                  strict_slashes=False)
+@conditional("timetables", max_age=60)
 def retrieve_timetable(timetable_id):
     """
     Retrieves a Timetables object
     """
-    redis_key = f"timetable:{timetable_id}"
-    
-    # Check Redis cache first
-    cached_timetable = cache.get_cache(redis_key)
-    if cached_timetable:
-        return jsonify(cached_timetable)
-    
-    timetable = storage.get(Timetable, timetable_id)
-    if timetable is None:
+    timetables = hydrate(Timetable, [timetable_id], requested_fields())
+    if not timetables:
         abort(404)
-        
-    # Store timetable data in Redis (cache it) for future requests
-    cache.set_cache(redis_key, timetable.to_dict())
     
-    return jsonify(timetable.to_dict())
+    return jsonify(timetables[0])
 
 
 @app_views.route("/timetables/<timetable_id>", methods=['DELETE'],
@@ -67,10 +60,8 @@ def delete_timetable(timetable_id):
     timetable.delete()
     storage.save()
     
-    # remove the timetable from the cache
-    redis_keys = [f"timetable:{timetable_id}", "all_timetables"]
-    for key in redis_keys:
-        cache.delete_cache(key)
+    cache.invalidate("timetables")
+    forget(Timetable, timetable_id)
     
     return jsonify({}), 200
 
@@ -95,10 +86,7 @@ def create_timetable():
     new_timetable = Timetable(**req)
     new_timetable.save()
     
-    # Cache the new timetable for 5 minutes
-    cache.delete_cache("all_timetables")
-    redis_key = f"timetable:{new_timetable.id}"
-    cache.set_cache(redis_key, new_timetable.to_dict())
+    cache.invalidate("timetables")
 
 
     return jsonify(new_timetable.to_dict()), 201
@@ -125,9 +113,7 @@ def update_timetable(timetable_id):
             setattr(timetable, k, v)
     storage.save()
     
-    # Update the cache for 5 minutes with the updated timetable
-    cache.delete_cache("all_timetables")
-    redis_key = f"timetable:{timetable_id}"
-    cache.set_cache(redis_key, timetable.to_dict())
+    cache.invalidate("timetables")
+    forget(Timetable, timetable_id)
 
     return jsonify(timetable.to_dict()), 200
@@ -8,6 +8,15 @@ from flask import jsonify, abort, request
 from api.v1.views import app_views
 from api.v1.app import auth
 from api.v1.app import cache
+from api.v1.utils.entities import forget, hydrate
+from api.v1.utils.pagination import paginate
+from api.v1.utils.fields import requested_fields
+
+
+@cache.cached("users:ids", tags=("users",))
+def _user_ids():
+    """Ids of every user"""
+    return [user.id for user in storage.all(User).values()]
 
 
 @app_views.route("/users", methods=['GET'],
@@ -16,20 +25,11 @@ def all_users():
     """
     Retrieves the list of all State objects
     """
+    page = paginate(User)
+    if page is not None:
+        return page
     
-    key = "all_users"
-    
-    #check cache first
-    cached_users = cache.get_cache(key)
-    if cached_users:
-        return jsonify(cached_users)
-    
-    users = storage.all(User).values()
-    users_list = [user.to_dict() for user in users]
-    
-    cache.set_cache(key, users_list)
-    
-    return jsonify(users_list)
+    return jsonify(hydrate(User, _user_ids(), requested_fields()))
 
 
 @app_views.route("/users/<user_id>", methods=['GET'],
@@ -45,22 +45,13 @@ def retrieve_user(user_id):
         if request.current_user is None:
             abort(404)
         else:
-            return jsonify(request.current_user.to_dict())
+            return jsonify(request.current_user.to_dict(requested_fields()))
         
-    key = f"user:{user_id}"
-    
-    #check cache first
-    cached_user = cache.get_cache(key)
-    if cached_user:
-        return jsonify(cached_user)
-    
-    user = storage.get(User, user_id)
-    if user is None:
+    users = hydrate(User, [user_id], requested_fields())
+    if not users:
         abort(404)
     
-    cache.set_cache(key, user.to_dict())
-    
-    return jsonify(user.to_dict())
+    return jsonify(users[0])
 
 
 @app_views.route("/users/<user_id>", methods=['DELETE'],
@@ -77,10 +68,8 @@ def delete_user(user_id):
     user.delete()
     storage.save()
     
-    # remove the user from the cache
-    redis_keys = [f"user:{user_id}", "all_users"]
-    for key in redis_keys:
-        cache.delete_cache(key)
+    cache.invalidate("users")
+    forget(User, user_id)
     
     return jsonify({}), 200
 
@@ -113,10 +102,7 @@ def create_user():
     new_user = User(**req)
     new_user.save()
     
-    # Cache the new user for 5 minutes
-    cache.delete_cache("all_users")
-    redis_key = f"user:{new_user.id}"
-    cache.set_cache(redis_key, new_user.to_dict())
+    cache.invalidate("users")
     
     return jsonify(new_user.to_dict()), 201
 
@@ -144,9 +130,7 @@ def update_user(user_id):
             setattr(user, k, v)
     storage.save()
     
-    # Update the cache for 5 minutes with the updated user
-    cache.delete_cache("all_users")
-    redis_key = f"user:{user_id}"
-    cache.set_cache(redis_key, user.to_dict())
+    cache.invalidate("users")
+    forget(User, user_id)
     
     return jsonify(user.to_dict()), 200
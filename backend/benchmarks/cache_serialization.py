@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+"""
+Encode/decode throughput and payload sizes of the cache codecs
+
+The values are real to_dict() outputs: lists of User, Project and Event
+instances built in memory, the same lists the list endpoints cache. Each
+installed serializer is measured without compression and with every
+installed compression, next to the codec the cache used before (json
+with a datetime default hook, and a decoder trying every string as a
+datetime).
+
+    python3 -m benchmarks.cache_serialization --rows 1000 --repeat 20
+
+Nothing is written to Redis or to the database.
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from api.v1.caching.serializers import COMPRESSIONS, SERIALIZERS, Codec
+from models.event import Event
+from models.project import Project
+from models.user import User
+
+
+def _legacy_dumps(value):
+    """What Cache.set_cache used to do."""
+    def default(obj):
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        raise TypeError("Type not serializable")
+    return json.dumps(value, default=default)
+
+
+def _legacy_loads(payload):
+    """What Cache.get_cache used to do."""
+    def hook(obj):
+        for key, value in obj.items():
+            try:
+                obj[key] = datetime.fromisoformat(value)
+            except (ValueError, TypeError):
+                pass
+        return obj
+    return json.loads(payload, object_hook=hook)
+
+
+def seed(rows):
+    """to_dict() lists of each model."""
+    now = datetime.utcnow()
+    users = [User(email=f"student{i}@example.edu", first_name="Ada",
+                  last_name=f"Student {i}", title="Miss",
+                  matric_number=f"CSC/{2020 + i % 5}/{i:05d}",
+                  role="student", level_id=str(uuid.uuid4()))
+             for i in range(rows)]
+    projects = [Project(course_id=str(uuid.uuid4()), name=f"Project {i}",
+                        description="Implement the algorithms of the week "
+                                    "and submit one file per task. " * 4,
+                        start=now, deadline=now + timedelta(days=7),
+                        total_points=100.0, project_type="individual")
+                for i in range(rows)]
+    events = [Event(level_id=str(uuid.uuid4()), title=f"Lecture {i}",
+                    date=now + timedelta(hours=i), venue="Hall B",
+                    type="lecture")
+              for i in range(rows)]
+    return {
+        "users": [user.to_dict() for user in users],
+        "projects": [project.to_dict() for project in projects],
+        "events": [event.to_dict() for event in events],
+    }
+
+
+def _time(func, arg, repeat):
+    """Best of repeat runs, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def codecs(min_bytes):
+    """(name, dumps, loads) of every codec available here."""
+    yield "legacy json", _legacy_dumps, _legacy_loads
+    for serializer, (_, module) in SERIALIZERS.items():
+        if module is None:
+            continue
+        for compression in COMPRESSIONS:
+            try:
+                codec = Codec(serializer, compression, min_bytes)
+            except ImportError:
+                continue
+            yield codec.name, codec.dumps, codec.loads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--min-bytes", type=int, default=1024,
+                        help="compression threshold")
+    args = parser.parse_args()
+
+    data = seed(args.rows)
+    for label, value in data.items():
+        print(f"\n{label} ({args.rows} rows)")
+        print(f"  {'codec':<16} {'bytes':>10} {'encode ms':>10} "
+              f"{'decode ms':>10}")
+        for name, dumps, loads in codecs(args.min_bytes):
+            payload = dumps(value)
+            print(f"  {name:<16} {len(payload):>10} "
+                  f"{_time(dumps, value, args.repeat):>10.2f} "
+                  f"{_time(loads, payload, args.repeat):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+"""
+to_dict() plus JSON encoding of a large list response, before and after
+the orjson provider, and the size and cost of compressing it
+
+The script builds --rows User, Project and Event instances in memory
+(10k by default) and times what a list endpoint does with them: call
+to_dict() on every object and encode the list with the app's JSON
+provider. "before" is Flask's default provider, "after" the orjson one.
+The encoded body is then compressed with gzip and, if installed, brotli
+at the levels the app uses.
+
+With the app's provider it also times the same list projected with
+?fields= (FIELDS), and the NDJSON stream body, one object per line.
+
+    python3 -m benchmarks.json_responses --rows 10000 --repeat 5
+
+Nothing is written to the database.
+"""
+import argparse
+import time
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from api.v1.utils import compression
+from api.v1.utils.json_provider import OrjsonProvider, orjson
+from benchmarks.cache_serialization import seed
+from models.event import Event
+from models.project import Project
+from models.user import User
+
+# the ?fields= projection timed
+FIELDS = ("id", "created_at")
+
+
+def _time(func, repeat):
+    """Best of repeat runs of func, in milliseconds, and its result."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def objects(rows):
+    """Model instances equivalent to the seeded to_dict() lists."""
+    classes = {"users": User, "projects": Project, "events": Event}
+    return {label: [classes[label](**d) for d in dicts]
+            for label, dicts in seed(rows).items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    providers = [("before (flask json)", DefaultJSONProvider(app))]
+    if orjson is not None:
+        providers.append(("after (orjson)", OrjsonProvider(app)))
+    else:
+        print("orjson is not installed, only the default provider is timed")
+
+    for label, objs in objects(args.rows).items():
+        print(f"\n{label} ({args.rows} objects)")
+        for name, provider in providers:
+            with app.app_context():
+                ms, body = _time(
+                    lambda: provider.response(
+                        [obj.to_dict() for obj in objs]).get_data(),
+                    args.repeat)
+            print(f"  {name:<22} {ms:>9.1f} ms  {len(body):>10} bytes")
+
+        name, app.json = providers[-1]
+        with app.app_context():
+            ms, projected = _time(
+                lambda: app.json.response(
+                    [obj.to_dict(FIELDS) for obj in objs]).get_data(),
+                args.repeat)
+            print(f"  {'?fields=' + ','.join(FIELDS):<22} {ms:>9.1f} ms  "
+                  f"{len(projected):>10} bytes")
+            ms, lines = _time(
+                lambda: "".join(app.json.dumps(obj.to_dict()) + "\n"
+                                for obj in objs),
+                args.repeat)
+            print(f"  {'ndjson':<22} {ms:>9.1f} ms  "
+                  f"{len(lines.encode()):>10} bytes")
+
+        encodings = ["gzip"] + (["br"] if compression.brotli else [])
+        for encoding in encodings:
+            ms, compressed = _time(
+                lambda: compression.encode(encoding, body), args.repeat)
+            print(f"  {encoding:<22} {ms:>9.1f} ms  "
+                  f"{len(compressed):>10} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+"""
+Memory of the records FileStorage keeps in memory, as model instances
+and as columns
+
+The script builds the records of --submissions Submissions with
+--tests TestResults each, as the JSON lines FileStorage reads, and
+measures with tracemalloc what decoding them and holding the result
+takes as model instances (the default layout) and in a ColumnStore per
+class (with FILE_STORAGE_COMPACT). It also times decoding into either,
+and getting the to_dict() output back from either, and checks both give
+the same dicts.
+
+    python3 -m benchmarks.storage_memory --submissions 20000 --tests 10
+
+Nothing is written to file.json.
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+from models.engine.columns import ColumnStore
+from models.submission import Submission
+from models.test_result import TestResult
+
+STATUSES = ("passed", "failed", "error")
+LANGUAGES = ("python", "c", "javascript")
+
+
+def records(submissions, tests):
+    """JSON encoded to_dict() outputs of Submissions and their
+    TestResults"""
+    students = [str(uuid.uuid4()) for _ in range(200)]
+    tasks = [str(uuid.uuid4()) for _ in range(50)]
+    projects = [str(uuid.uuid4()) for _ in range(10)]
+    start = datetime(2024, 1, 1)
+    rows = {"Submission": [], "TestResult": []}
+    for i in range(submissions):
+        task_id = tasks[i % len(tasks)]
+        submission = Submission(
+            student_id=students[i % len(students)], task_id=task_id,
+            project_id=projects[i % len(projects)],
+            file_url=f"submissions/{uuid.uuid4()}.py",
+            language=LANGUAGES[i % len(LANGUAGES)], status="graded",
+            passed_tests=tests - i % 3, score=100 - i % 3 * 10)
+        submission.created_at = start + timedelta(seconds=i)
+        rows["Submission"].append(submission.to_dict())
+        for j in range(tests):
+            result = TestResult(
+                submission_id=submission.id, task_id=task_id,
+                test_case_id=tasks[j % len(tasks)], name=f"test {j}",
+                status=STATUSES[(i + j) % len(STATUSES)],
+                actual_output="ok\n", passed=(i + j) % 3 == 0)
+            rows["TestResult"].append(result.to_dict())
+    return {name: [json.dumps(row) for row in dicts]
+            for name, dicts in rows.items()}
+
+
+def _measure(build):
+    """bytes allocated by build() and still held by what it returns,
+    its duration in milliseconds (timed apart, tracemalloc slowing it
+    down), and the result"""
+    ms = _time(build)
+    gc.collect()
+    tracemalloc.start()
+    held = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, ms, held
+
+
+def _time(func):
+    """duration of func() in milliseconds"""
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--submissions", type=int, default=20000)
+    parser.add_argument("--tests", type=int, default=10)
+    args = parser.parse_args()
+
+    classes = {"Submission": Submission, "TestResult": TestResult}
+    for name, rows in records(args.submissions, args.tests).items():
+        cls = classes[name]
+        print(f"\n{name} ({len(rows)} records)")
+
+        size, ms, objs = _measure(
+            lambda: [cls(**json.loads(row)) for row in rows])
+        dicts_ms = _time(lambda: [obj.to_dict() for obj in objs])
+        print(f"  {'instances':<10} {size / 2 ** 20:>8.1f} MiB "
+              f"{size / len(rows):>7.0f} B/record  load {ms:>8.1f} ms  "
+              f"to_dict {dicts_ms:>8.1f} ms")
+
+        def fill():
+            store = ColumnStore()
+            for row in rows:
+                record = json.loads(row)
+                store.put(f"{name}.{record['id']}", record)
+            return store
+        size, ms, store = _measure(fill)
+        keys = [f"{name}.{obj.id}" for obj in objs]
+        dicts_ms = _time(lambda: [store.get(key) for key in keys])
+        print(f"  {'columns':<10} {size / 2 ** 20:>8.1f} MiB "
+              f"{size / len(rows):>7.0f} B/record  load {ms:>8.1f} ms  "
+              f"get     {dicts_ms:>8.1f} ms")
+
+        same = all(store.get(key) == obj.to_dict()
+                   for key, obj in zip(keys, objs))
+        print(f"  same to_dict() output: {same}")
+
+
+if __name__ == "__main__":
+    main()
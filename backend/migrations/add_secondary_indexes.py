@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+"""
+Adds the secondary indexes declared on the models to an existing database
+
+Base.metadata.create_all() only creates missing tables, so a database
+created before the indexes were declared never gets them. This script
+compares the indexes declared in __table_args__ with the ones present
+and creates the missing ones. Duplicate drafts are collapsed first
+(keeping the most recently updated one) so that the unique
+(user_id, task_id) index on drafts can be built.
+
+Run it from the backend directory with the usual MySQL environment:
+
+    MYSQL_USER=... MYSQL_PWD=... MYSQL_HOST=... MYSQL_DB=... \\
+        python3 -m migrations.add_secondary_indexes [--dry-run]
+"""
+import os
+import sys
+from sqlalchemy import create_engine, inspect, text
+
+from models.engine.db_storage import Base
+
+
+def engine_from_env():
+    """builds an engine from the same variables as DBStorage"""
+    user = os.getenv('MYSQL_USER')
+    passwd = os.getenv('MYSQL_PWD')
+    host = os.getenv('MYSQL_HOST')
+    db = os.getenv('MYSQL_DB')
+    return create_engine(f'mysql+pymysql://{user}:{passwd}@{host}/{db}')
+
+
+def missing_indexes(engine):
+    """returns the declared indexes that do not exist in the database"""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                missing.append(index)
+    return missing
+
+
+def dedupe_drafts(conn):
+    """deletes all but the latest draft of each (user_id, task_id)"""
+    result = conn.execute(text(
+        "DELETE d1 FROM drafts d1 JOIN drafts d2 "
+        "ON d1.user_id = d2.user_id AND d1.task_id = d2.task_id "
+        "AND (d1.updated_at < d2.updated_at "
+        "OR (d1.updated_at = d2.updated_at AND d1.id < d2.id))"))
+    return result.rowcount
+
+
+def upgrade(engine, dry_run=False):
+    """creates every missing index, returns their names"""
+    indexes = missing_indexes(engine)
+    if dry_run:
+        return [index.name for index in indexes]
+    with engine.begin() as conn:
+        for index in indexes:
+            if index.unique and index.table.name == 'drafts':
+                removed = dedupe_drafts(conn)
+                print(f"removed {removed} duplicate drafts")
+            print(f"creating {index.name} on {index.table.name}")
+            index.create(conn)
+    return [index.name for index in indexes]
+
+
+if __name__ == '__main__':
+    dry_run = '--dry-run' in sys.argv[1:]
+    names = upgrade(engine_from_env(), dry_run=dry_run)
+    if not names:
+        print("all declared indexes already exist")
+    elif dry_run:
+        print("missing indexes: " + ", ".join(names))
@@ -1,4 +1,5 @@
 from datetime import datetime
+from functools import lru_cache
 import models
 from sqlalchemy import Column, String, DateTime
 from sqlalchemy.ext.declarative import declarative_base
@@ -6,6 +7,81 @@ import uuid
 
 time = "%Y-%m-%dT%H:%M:%S.%f"
 
+
+@lru_cache(maxsize=65536)
+def format_time(value):
+    """value formatted with time; the same objects are serialized over
+    and over, so their timestamps are only formatted once. The cache is
+    sized for the largest lists served whole: a list with more distinct
+    timestamps than it holds misses on every one."""
+    # same output as strftime(time) for naive datetimes, twice as fast
+    return value.isoformat(timespec="microseconds")
+
+
+class Serializer:
+    """to_dict() of one model class
+
+    One is set up per class (see serializer_for), and each field list it
+    is given is resolved once, so serializing an object is a copy of its
+    __dict__ or a lookup per requested field.
+    """
+    # attributes never serialized
+    HIDDEN = ("_sa_instance_state",)
+    # attributes serialized as strings formatted with time
+    TIMES = ("created_at", "updated_at")
+    # field lists resolved at most, as they come from query strings
+    MAX_PROJECTIONS = 64
+
+    def __init__(self, cls):
+        self.name = cls.__name__
+        self._projections = {}
+
+    def projection(self, fields):
+        """(field, is a timestamp) of each serializable field of fields"""
+        plan = self._projections.get(fields)
+        if plan is None:
+            if len(self._projections) >= self.MAX_PROJECTIONS:
+                self._projections.clear()
+            plan = self._projections[fields] = tuple(
+                (field, field in self.TIMES) for field in fields
+                if field not in self.HIDDEN)
+        return plan
+
+    def __call__(self, obj, fields=None):
+        """obj.to_dict(fields)"""
+        data = obj.__dict__
+        if fields is None:
+            result = data.copy()
+            result.pop("_sa_instance_state", None)
+            for field in self.TIMES:
+                value = result.get(field)
+                if isinstance(value, datetime):
+                    result[field] = format_time(value)
+            result["__class__"] = self.name
+            return result
+        result = {}
+        for field, is_time in self.projection(fields):
+            if field == "__class__":
+                result[field] = self.name
+            elif field in data:
+                value = data[field]
+                if is_time and isinstance(value, datetime):
+                    value = format_time(value)
+                result[field] = value
+        return result
+
+
+_serializers = {}
+
+
+def serializer_for(cls):
+    """the Serializer of cls"""
+    serializer = _serializers.get(cls)
+    if serializer is None:
+        serializer = _serializers[cls] = Serializer(cls)
+    return serializer
+
+
 if models.storage_t == "db":
     Base = declarative_base()
 else:
@@ -37,6 +113,14 @@ class BaseModel:
             self.created_at = datetime.utcnow()
             self.updated_at = self.created_at
             
+    if models.storage_t != "db":
+        def __setattr__(self, name, value):
+            """sets an attribute and flags the object for the next save"""
+            object.__setattr__(self, name, value)
+            storage = getattr(models, "storage", None)
+            if storage is not None:
+                storage.touch(self, name)
+
     def __str__(self):
         """String representation of the BaseModel class"""
         return "[{:s}] ({:s}) {}".format(self.__class__.__name__, self.id,
@@ -48,17 +132,12 @@ class BaseModel:
         models.storage.new(self)
         models.storage.save()
         
-    def to_dict(self):
-        """returns a dictionary containing all keys/values of the instance"""
-        new_dict = self.__dict__.copy()
-        if "created_at" in new_dict:
-            new_dict["created_at"] = new_dict["created_at"].strftime(time)
-        if "updated_at" in new_dict:
-            new_dict["updated_at"] = new_dict["updated_at"].strftime(time)
-        new_dict["__class__"] = self.__class__.__name__
-        if "_sa_instance_state" in new_dict:
-            del new_dict["_sa_instance_state"]
-        return new_dict
+    def to_dict(self, fields=None):
+        """returns a dictionary containing all keys/values of the instance,
+        or only those named in fields"""
+        if fields is not None and not isinstance(fields, tuple):
+            fields = tuple(fields)
+        return serializer_for(self.__class__)(self, fields)
         
     def delete(self):
         """delete the current instance from the storage"""
@@ -2,7 +2,7 @@
 """ holds class Course"""
 from models import storage_t
 from models.base_model import BaseModel, Base
-from sqlalchemy import Column, String, Text, Integer, ForeignKey
+from sqlalchemy import Column, String, Text, Integer, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 
@@ -10,6 +10,9 @@ class Course(BaseModel, Base):
     """Representation of a Course """
     if storage_t == 'db':
         __tablename__ = 'courses'
+        __table_args__ = (
+            Index('ix_courses_created', 'created_at', 'id'),
+        )
         instructor_id = Column(String(128), ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
         title = Column(String(255), nullable=False)
         course_code = Column(String(50), nullable=False)
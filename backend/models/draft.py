@@ -1,7 +1,7 @@
 #!/usr/bin/python3
 """Draft model to persist inline editor content for tasks."""
 from models.base_model import BaseModel, Base
-from sqlalchemy import Column, String, Text
+from sqlalchemy import Column, String, Text, Index
 
 
 class Draft(BaseModel, Base):
@@ -13,11 +13,16 @@ class Draft(BaseModel, Base):
 
     if storage_t == 'db':
         __tablename__ = 'drafts'
+        __table_args__ = (
+            Index('uq_drafts_user_task', 'user_id', 'task_id', unique=True),
+        )
         user_id = Column(String(128), nullable=False)
         task_id = Column(String(128), nullable=False)
         code = Column(Text, nullable=True)
         language = Column(String(64), nullable=True)
     else:
+        # hash indexes FileStorage keeps for equality search
+        __indexes__ = (("user_id", "task_id"),)
         user_id = ""
         task_id = ""
         code = ""
@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+"""
+Column-oriented record store
+
+When FILE_STORAGE_COMPACT is set, FileStorage keeps the recently used
+records of each class in a ColumnStore instead of keeping the objects
+built from them. A record takes one slot per field in the class's
+column lists instead of an instance with its own __dict__, and the
+string values repeated across records, such as a status, a language or
+the id of a parent object, are interned so every record shares one copy.
+
+get() returns exactly the dict to_dict() returned for the record, so an
+object built from it is the same as one built from the stored record.
+"""
+import sys
+
+# the slot of a field a record does not have
+_MISSING = object()
+
+
+class ColumnStore:
+    """records of one class, one list per field"""
+
+    # fields whose values are unique to a record, not worth interning
+    UNIQUE = ("id", "created_at", "updated_at")
+
+    def __init__(self):
+        # field -> list of values by row
+        self.columns = {}
+        # key -> row
+        self.rows = {}
+        # rows of removed records, reused first
+        self.free = []
+        self.size = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def _value(self, field, value):
+        """value as stored in the column of field"""
+        if type(value) is str and field not in self.UNIQUE:
+            return sys.intern(value)
+        return value
+
+    def _grow(self):
+        """a new row, empty in every column"""
+        row = self.size
+        self.size += 1
+        for column in self.columns.values():
+            column.append(_MISSING)
+        return row
+
+    def put(self, key, record):
+        """stores record, a to_dict() output, under key"""
+        row = self.rows.get(key)
+        if row is None:
+            row = self.free.pop() if self.free else self._grow()
+            self.rows[key] = row
+        for field, column in self.columns.items():
+            if field in record:
+                column[row] = self._value(field, record[field])
+            else:
+                column[row] = _MISSING
+        for field in record:
+            if field not in self.columns:
+                column = self.columns[field] = [_MISSING] * self.size
+                column[row] = self._value(field, record[field])
+
+    def get(self, key):
+        """the record stored under key, or None"""
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        record = {}
+        for field, column in self.columns.items():
+            value = column[row]
+            if value is not _MISSING:
+                record[field] = value
+        return record
+
+    def pop(self, key):
+        """removes the record stored under key"""
+        row = self.rows.pop(key, None)
+        if row is not None:
+            for column in self.columns.values():
+                column[row] = _MISSING
+            self.free.append(row)
+
+    def nbytes(self):
+        """estimated memory of the columns, the row map and the values,
+        counting a value shared by several records once"""
+        size = sys.getsizeof(self.rows) + sys.getsizeof(self.free)
+        values = {}
+        for column in self.columns.values():
+            size += sys.getsizeof(column)
+            for value in column:
+                if value is not _MISSING:
+                    values[id(value)] = value
+        return size + sum(sys.getsizeof(value) for value in values.values())
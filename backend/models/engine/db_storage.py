@@ -3,7 +3,7 @@
 Contains the class DBStorage
 """
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func, and_, or_
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.pool import QueuePool
 import models
@@ -20,12 +20,15 @@ from models.grade import Grade
 from models.event import Event
 from models.timetable import Timetable
 from models.level import Level
+from models.draft import Draft
+from models.engine.query import split_lookup, split_order
 
 
 classes = {"User": User, "Course": Course, "Project": Project,
            "Task": Task, "Resource": Resource, "TestCase": TestCase,
            "TestResult": TestResult, "Event": Event, "Submission": Submission,
-           "Level": Level, "Grade": Grade, "Timetable": Timetable}
+           "Level": Level, "Grade": Grade, "Timetable": Timetable,
+           "Draft": Draft}
 
 
 class DBStorage:
@@ -69,6 +72,11 @@ class DBStorage:
         """add the object to the current database session"""
         self.__session.add(obj)
 
+    def bulk_new(self, objs):
+        """add several objects to the current database session; they are
+        written together, in one transaction, by the next save()"""
+        self.__session.add_all(list(objs))
+
     def save(self):
         """commit all changes of the current database session"""
         self.__session.commit()
@@ -92,20 +100,94 @@ class DBStorage:
     def get(self, cls, cls_id):
         """method to retrieve one object Returns the object
         based on the class and its ID, or None if not found"""
-        objs = models.storage.all(cls)
-        for value in objs.values():
-            if value.id == cls_id:
-                return value
-        return None
-    
-
-    def search(self, cls, attributes):
+        if cls_id is None:
+            return None
+        if isinstance(cls, str):
+            cls = classes.get(cls)
+        if cls is None:
+            return None
+        return self.__session.get(cls, cls_id)
+
+    def get_many(self, cls, ids):
+        """retrieve several objects of a class by ID in one IN query.
+        Returns a dict keyed by ID; missing IDs are left out"""
+        if isinstance(cls, str):
+            cls = classes.get(cls)
+        ids = [i for i in dict.fromkeys(ids or []) if i is not None]
+        if cls is None or not ids:
+            return {}
+        objs = self.__session.query(cls).filter(cls.id.in_(ids)).all()
+        return {obj.id: obj for obj in objs}
+
+    def _where(self, cls, attributes):
+        """compiles a filter dict into SQLAlchemy clauses"""
+        clauses = []
+        for key, value in (attributes or {}).items():
+            field, op = split_lookup(key)
+            column = getattr(cls, field)
+            if op == "eq":
+                clauses.append(column == value)
+            elif op == "ne":
+                clauses.append(column != value)
+            elif op == "in":
+                clauses.append(column.in_(list(value)))
+            elif op == "lt":
+                clauses.append(column < value)
+            elif op == "lte":
+                clauses.append(column <= value)
+            elif op == "gt":
+                clauses.append(column > value)
+            else:
+                clauses.append(column >= value)
+        return clauses
+
+    def _query(self, cls, attributes=None, order_by=None):
+        """builds a filtered and ordered query for cls"""
+        if isinstance(cls, str):
+            cls = classes[cls]
+        query = self.__session.query(cls).filter(*self._where(cls, attributes))
+        for field, descending in split_order(order_by):
+            column = getattr(cls, field)
+            query = query.order_by(column.desc() if descending else column)
+        return query
+
+    def search(self, cls, attributes=None, order_by=None, limit=None):
         """ Search all objects with matching attributes
+
+        The filter is pushed down to the database as a WHERE clause,
+        see models.engine.query for the supported lookups.
         """
-        objs = self.all(cls).values()
-        
-        matching_objs = [
-            obj for obj in objs
-            if all(getattr(obj, key) == value for key, value in attributes.items())
-        ]
-        return matching_objs
\ No newline at end of file
+        query = self._query(cls, attributes, order_by)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    def page(self, cls, attributes=None, limit=None, after=None):
+        """ keyset page of cls ordered by (created_at, id)
+
+        after is the (created_at, id) of the last object of the previous
+        page; the query seeks past it instead of using OFFSET.
+        """
+        if isinstance(cls, str):
+            cls = classes[cls]
+        query = self._query(cls, attributes, ["created_at", "id"])
+        if after is not None:
+            created_at, obj_id = after
+            query = query.filter(or_(
+                cls.created_at > created_at,
+                and_(cls.created_at == created_at, cls.id > obj_id)))
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    def count(self, cls=None, attributes=None):
+        """counts the objects of cls matching attributes, or of
+        every class when cls is None"""
+        if cls is None:
+            return sum(self.count(clss) for clss in classes.values())
+        if isinstance(cls, str):
+            cls = classes[cls]
+        # count(id) keeps the table in the FROM clause when nothing is
+        # filtered; a bare count(*) would select from no table at all
+        return self.__session.query(func.count(cls.id)) \
+            .filter(*self._where(cls, attributes)).scalar()
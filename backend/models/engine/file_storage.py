@@ -3,8 +3,21 @@
 Contains the FileStorage class
 """
 
+import atexit
+import fcntl
+import functools
 import json
+import mmap
+import os
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
 import models
+from models.engine.columns import ColumnStore
+from models.engine.query import matches, sort_objects, split_lookup
 from models.base_model import BaseModel
 from models.user import User
 from models.course import Course
@@ -38,64 +51,751 @@ classes = {
 }
 
 
+class _Reader:
+    """read access to one version of a storage file
+
+    It stays open, even once the file is replaced or removed, for as
+    long as records located in it may still be loaded. Snapshots, which
+    never change once written, are memory-mapped.
+    """
+
+    def __init__(self, path, mapped=False):
+        self.file = open(path, "rb")
+        self.ino = os.fstat(self.file.fileno()).st_ino
+        self.map = None
+        if mapped and os.fstat(self.file.fileno()).st_size:
+            self.map = mmap.mmap(self.file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+
+    def read(self, offset, length):
+        """the bytes at offset"""
+        if self.map is not None:
+            return self.map[offset:offset + length]
+        return os.pread(self.file.fileno(), length, offset)
+
+    def lines(self, offset=0):
+        """yields (line, offset) from offset on"""
+        source = self.map if self.map is not None else self.file
+        source.seek(offset)
+        for line in iter(source.readline, b""):
+            yield line, offset
+            offset += len(line)
+
+
 class FileStorage:
-    """serializes instances to a JSON file & deserializes back to instances"""
+    """serializes instances to a JSON file & deserializes back to instances
+
+    The store is a snapshot (__file_path) plus an append-only journal
+    next to it, both made of JSON lines, one record per object. save()
+    appends one line per object created, changed or deleted since the
+    last save, so a write costs as much as the change, not the dataset,
+    and a crash mid-write can only lose the torn last line, which
+    reload() skips. Once the journal outgrows compact_bytes a background
+    thread folds it into a fresh snapshot, written to a temporary file
+    and renamed over the old one, with an offset index (.idx) next to
+    it.
+
+    Records are only located on reload: the snapshot is memory-mapped
+    and its offset index read, without parsing the records. An object
+    is built on first access, and the cache_size most recently used ones
+    are kept; the others are dropped unless still referenced elsewhere,
+    and built again from their record when needed. With compact_records
+    set, the records of the recently used objects are kept instead, in
+    one ColumnStore per class (see models.engine.columns), which takes a
+    fraction of the memory of the objects and still spares reading and
+    parsing the record.
+
+    Besides the records, keys are kept in one dict per class and in the
+    hash indexes their class declares in __indexes__ (a field name or a
+    tuple of field names per index), so get, count and equality search
+    do not scan the other objects.
+    """
 
     # string - path to the JSON file
     __file_path = "file.json"
-    # dictionary - empty but will store all objects by <class name>.id
-    __objects = {}
+    # every loaded object still in use, by <class name>.id
+    __objects = weakref.WeakValueDictionary()
+    # key -> (reader, offset, length) of the object's latest record
+    __located = {}
+    # objects with changes not saved yet, kept in memory
+    __pinned = {}
+    # least recently used first: key -> object, or None with
+    # compact_records, the record then being in __columns
+    __recent = OrderedDict()
+    # class name -> ColumnStore of the records of __recent
+    __columns = {}
+    # keys saved or deleted since the last save()
+    __dirty = set()
+    __deleted = set()
+    __lock = threading.RLock()
+    # open append handle on the journal, a reader of the same file, and
+    # whether it awaits an fsync
+    __journal = None
+    __journal_reader = None
+    __unsynced = False
+    __flusher = None
+    __compactor = None
+    # (snapshot stamp, journal inode, journal offset) already applied,
+    # None until the first reload
+    __applied = None
+    # class name -> {key: None}
+    __by_class = {}
+    # class name -> {index fields: {field values: {key: None}}}
+    __indexes = {}
+    # key -> {index fields: field values} the object is filed under
+    __indexed = {}
+    # keys met while reading the whole store again, None otherwise
+    __seen = None
+    # class name -> [(key, indexed field values)] read from .idx on a
+    # cold start and not filed yet
+    __pending = {}
+
+    # seconds between fsyncs of the journal; 0 syncs on every save
+    fsync_interval = float(os.getenv("FILE_STORAGE_FSYNC_INTERVAL", 0.05))
+    # journal size that triggers a compaction
+    compact_bytes = int(os.getenv("FILE_STORAGE_COMPACT_BYTES",
+                                  4 * 1024 * 1024))
+    # objects kept in memory after use
+    cache_size = int(os.getenv("FILE_STORAGE_CACHE_SIZE", 10000))
+    # keep their records in columns rather than the objects themselves
+    compact_records = os.getenv("FILE_STORAGE_COMPACT", "").lower() in (
+        "1", "true", "yes")
+
+    SNAPSHOT_VERSION = 2
+
+    def _path(self, suffix):
+        """path of a file next to the snapshot"""
+        return self.__file_path + suffix
 
     def all(self, cls=None):
-        """returns the dictionary __objects"""
-        if cls is not None:
-            new_dict = {}
-            for key, value in self.__objects.items():
-                if cls == value.__class__ or cls == value.__class__.__name__:
-                    new_dict[key] = value
-            return new_dict
-        return self.__objects
-    
-    def search(self, cls, attributes):
-        """returns the dictionary __objects"""
+        """returns a dictionary of the objects, of cls if given"""
         if cls is not None:
-            new_dict = {}
-            for key, value in self.__objects.items():
-                if cls == value.__class__ or cls == value.__class__.__name__:
-                    new_dict[key] = value
-            return new_dict
-        return self.__objects
+            name = cls if isinstance(cls, str) else cls.__name__
+            keys = list(self.__by_class.get(name, ()))
+        else:
+            keys = [key for objs in list(self.__by_class.values())
+                    for key in list(objs)]
+        found = {}
+        for key in keys:
+            obj = self._get(key)
+            if obj is not None:
+                found[key] = obj
+        return found
+
+    def _get(self, key):
+        """the object under key, built from its record if not in use"""
+        with self.__lock:
+            obj = self.__objects.get(key)
+            record = None
+            if obj is None:
+                if self.compact_records and key in self.__recent:
+                    data = self.__columns[key.split(".", 1)[0]].get(key)
+                else:
+                    location = self.__located.get(key)
+                    if location is None:
+                        return None
+                    reader, offset, length = location
+                    record = data = json.loads(
+                        reader.read(offset, length))["obj"]
+                obj = classes[data["__class__"]](**data)
+                self.__objects[key] = obj
+            if key not in self.__pinned:
+                self._use(key, obj, record)
+            return obj
+
+    def _use(self, key, obj, record=None):
+        """marks obj as the most recently used, dropping the least
+        recently used beyond cache_size; record is its to_dict() when
+        at hand"""
+        if not self.compact_records:
+            self.__recent[key] = obj
+        elif record is not None or key not in self.__recent:
+            self.__columns.setdefault(key.split(".", 1)[0], ColumnStore()) \
+                .put(key, obj.to_dict() if record is None else record)
+            self.__recent[key] = None
+        self.__recent.move_to_end(key)
+        while len(self.__recent) > self.cache_size:
+            self._forget(next(iter(self.__recent)))
+
+    def _forget(self, key):
+        """drops key from the recently used"""
+        if self.__recent.pop(key, 0) is None:
+            self.__columns[key.split(".", 1)[0]].pop(key)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _index_fields(cls):
+        """the field tuples of the indexes cls declares"""
+        return [(index,) if isinstance(index, str) else tuple(index)
+                for index in getattr(cls, "__indexes__", ())]
+
+    def _file(self, key, name, source):
+        """adds key to the indexes of class name, with the field values
+        of source, an object or a record"""
+        if self.__pending:
+            self._ensure_filed(name)
+        cls = classes.get(name)
+        if isinstance(source, dict):
+            def value(field):
+                if field in source:
+                    return source[field]
+                return getattr(cls, field, None)
+        else:
+            def value(field):
+                return getattr(source, field, None)
+        indexes = self.__indexes.setdefault(name, {})
+        filed = {}
+        for fields in self._index_fields(cls):
+            values = tuple(map(value, fields))
+            try:
+                indexes.setdefault(fields, {}).setdefault(values, {})[key] = None
+            except TypeError:
+                continue  # unhashable value, left to the scan
+            filed[fields] = values
+        if filed:
+            self.__indexed[key] = filed
+
+    def _ensure_filed(self, name):
+        """files the keys of class name still pending from a cold start"""
+        pending = self.__pending.pop(name, None)
+        if not pending:
+            return
+        cls = classes.get(name)
+        keys = self.__by_class.get(name, {})
+        indexes = self.__indexes.setdefault(name, {})
+        plans = [(fields, indexes.setdefault(fields, {}),
+                  [(field, getattr(cls, field, None)) for field in fields])
+                 for fields in self._index_fields(cls)]
+        for key, record in pending:
+            if key not in keys or key in self.__indexed:
+                continue
+            filed = {}
+            for fields, buckets, defaults in plans:
+                values = tuple([record.get(field, default)
+                                for field, default in defaults])
+                try:
+                    bucket = buckets.get(values)
+                    if bucket is None:
+                        bucket = buckets[values] = {}
+                except TypeError:
+                    continue
+                bucket[key] = None
+                filed[fields] = values
+            if filed:
+                self.__indexed[key] = filed
+
+    def _unfile(self, key, name):
+        """removes key from the indexes of class name"""
+        if self.__pending:
+            self._ensure_filed(name)
+        indexes = self.__indexes.get(name, {})
+        for fields, values in self.__indexed.pop(key, {}).items():
+            bucket = indexes[fields][values]
+            bucket.pop(key, None)
+            if not bucket:
+                del indexes[fields][values]
+
+    def _locate(self, key, location, record):
+        """records where the latest record of key is, filing key with
+        the record's field values"""
+        name = key.split(".", 1)[0]
+        self._unfile(key, name)
+        self.__by_class.setdefault(name, {})[key] = None
+        self.__located[key] = location
+        self._file(key, name, record)
+
+    def _remove(self, key):
+        """drops key from every structure"""
+        name = key.split(".", 1)[0]
+        if key in self.__by_class.get(name, ()):
+            del self.__by_class[name][key]
+            self._unfile(key, name)
+        self.__objects.pop(key, None)
+        self.__pinned.pop(key, None)
+        self._forget(key)
+        self.__located.pop(key, None)
 
     def new(self, obj):
         """sets in __objects the obj with key <obj class name>.id"""
         if obj is not None:
-            key = obj.__class__.__name__ + "." + obj.id
-            self.__objects[key] = obj
+            name = obj.__class__.__name__
+            key = name + "." + obj.id
+            with self.__lock:
+                self._unfile(key, name)
+                self.__by_class.setdefault(name, {})[key] = None
+                self.__objects[key] = obj
+                self.__pinned[key] = obj
+                self._forget(key)
+                self._file(key, name, obj)
+                self.__dirty.add(key)
+                self.__deleted.discard(key)
+
+    def touch(self, obj, name=None):
+        """flags a stored obj whose attributes changed for the next save(),
+        refiling it if name is an indexed field"""
+        key = obj.__class__.__name__ + "." + str(obj.__dict__.get("id"))
+        if self.__objects.get(key) is obj:
+            with self.__lock:
+                self.__dirty.add(key)
+                self.__pinned[key] = obj
+                self._forget(key)
+                if any(name in fields
+                       for fields in self.__indexed.get(key, ())):
+                    self._unfile(key, obj.__class__.__name__)
+                    self._file(key, obj.__class__.__name__, obj)
+
+    def bulk_new(self, objs):
+        """sets several objects in __objects; they are written together
+        by the next save()"""
+        for obj in objs:
+            self.new(obj)
 
     def save(self):
-        """serializes __objects to the JSON file (path: __file_path)"""
-        json_objects = {}
-        for key in self.__objects:
-            json_objects[key] = self.__objects[key].to_dict()
-        with open(self.__file_path, 'w') as f:
-            json.dump(json_objects, f)
+        """appends the objects changed since the last save to the journal"""
+        with self.__lock:
+            if not self.__dirty and not self.__deleted:
+                return
+            saved = [(key, self.__pinned[key], self.__pinned[key].to_dict())
+                     for key in self.__dirty if key in self.__pinned]
+            lines = [json.dumps({"op": "put", "key": key,
+                                 "obj": record}).encode() + b"\n"
+                     for key, _, record in saved]
+            lines += [json.dumps({"op": "del", "key": key}).encode() + b"\n"
+                      for key in self.__deleted]
+            self.__dirty.clear()
+            self.__deleted.clear()
+            reader, offset, size = self._append(b"".join(lines))
+            # saved objects can now be dropped and built again
+            for (key, obj, record), line in zip(saved, lines):
+                self.__located[key] = (reader, offset, len(line))
+                offset += len(line)
+                self.__pinned.pop(key, None)
+                self._use(key, obj, record)
+        if size >= self.compact_bytes:
+            self.compact(wait=False)
 
-    def reload(self):
-        """deserializes the JSON file to __objects"""
+    def _append(self, data):
+        """writes data at the end of the journal; returns a reader of the
+        journal, the offset data was written at and the journal's new
+        size"""
+        with open(self._path(".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            journal = self._journal()
+            start = os.fstat(journal.fileno()).st_size
+            if start and os.pread(journal.fileno(), 1, start - 1) != b"\n":
+                # end the line torn by a crash so it stays on its own
+                journal.write(b"\n")
+                start += 1
+            journal.write(data)
+            journal.flush()
+            size = start + len(data)
+            stamp, inode, offset = self.__applied or (None, None, 0)
+            if inode == self.__journal_reader.ino and offset == start:
+                # nobody else wrote in between, no need to replay our own
+                FileStorage.__applied = (stamp, inode, size)
+        if self.fsync_interval <= 0:
+            os.fsync(journal.fileno())
+        else:
+            self._sync_later()
+        return self.__journal_reader, start, size
+
+    def _journal(self):
+        """the append handle on the journal, reopened if a compaction
+        moved the file away"""
+        path = self._path(".journal")
+        journal = self.__journal
         try:
-            with open(self.__file_path, 'r') as f:
+            if journal is not None and \
+                    os.stat(path).st_ino == os.fstat(journal.fileno()).st_ino:
+                return journal
+        except FileNotFoundError:
+            pass
+        if journal is not None:
+            os.fsync(journal.fileno())
+            journal.close()
+        FileStorage.__journal = open(path, "ab+")
+        FileStorage.__journal_reader = _Reader(path)
+        return FileStorage.__journal
+
+    def _sync_later(self):
+        """groups the fsyncs of the saves of the next fsync_interval"""
+        FileStorage.__unsynced = True
+        if self.__flusher is None:
+            FileStorage.__flusher = threading.Thread(
+                target=self._flush_loop, name="file-storage-fsync",
+                daemon=True)
+            self.__flusher.start()
+            atexit.register(self._at_exit)
+
+    def _flush_loop(self):
+        """fsyncs the journal every fsync_interval while there are writes"""
+        while True:
+            time.sleep(self.fsync_interval)
+            self.flush()
+
+    def _at_exit(self):
+        """lets a running compaction finish and syncs the journal"""
+        if self.__compactor is not None:
+            self.__compactor.join()
+        self.flush()
+
+    def flush(self):
+        """fsyncs the journal writes not synced yet"""
+        with self.__lock:
+            if self.__unsynced and self.__journal is not None:
+                os.fsync(self.__journal.fileno())
+            FileStorage.__unsynced = False
+
+    def compact(self, wait=True):
+        """folds the journal into a fresh snapshot; with wait=False it
+        runs in a background thread"""
+        if not wait:
+            with self.__lock:
+                if self.__compactor is not None and \
+                        self.__compactor.is_alive():
+                    return
+                if self.__compactor is None:
+                    atexit.register(self._at_exit)
+                FileStorage.__compactor = threading.Thread(
+                    target=self.compact, name="file-storage-compact",
+                    daemon=True)
+                self.__compactor.start()
+            return
+        with open(self._path(".compact"), "a") as compacting:
+            try:
+                fcntl.flock(compacting, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return  # another process is compacting
+            with open(self._path(".lock"), "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                with self.__lock:
+                    # catch up with other processes, then start a new
+                    # journal; the old one stays until the snapshot
+                    # holding its records is in place. One left by a
+                    # compaction that did not finish is folded first.
+                    self.reload()
+                    if not os.path.exists(self._path(".journal.old")) and \
+                            os.path.exists(self._path(".journal")):
+                        os.replace(self._path(".journal"),
+                                   self._path(".journal.old"))
+                    # the files whose records the new snapshot holds
+                    folded = set()
+                    for path in (self.__file_path,
+                                 self._path(".journal.old")):
+                        try:
+                            folded.add(os.stat(path).st_ino)
+                        except FileNotFoundError:
+                            pass
+            entries = self._write_snapshot()
+            try:
+                os.remove(self._path(".journal.old"))
+            except FileNotFoundError:
+                pass
+            with self.__lock:
+                # point the records at the new snapshot, so the old
+                # files can be closed
+                reader = _Reader(self.__file_path, mapped=True)
+                for key, offset, length, _ in entries:
+                    if key in self.__dirty or \
+                            key not in self.__by_class.get(
+                                key.split(".", 1)[0], ()):
+                        continue
+                    # saved to the new journal while the snapshot was
+                    # written: that record is newer
+                    location = self.__located.get(key)
+                    if location is not None and \
+                            location[0].ino not in folded:
+                        continue
+                    self.__located[key] = (reader, offset, length)
+                    # loaded from the older format until now
+                    obj = self.__pinned.pop(key, None)
+                    if obj is not None:
+                        self._use(key, obj)
+                FileStorage.__applied = (self._stamp(self.__file_path),
+                                         None, 0)
+
+    def _write_snapshot(self):
+        """writes the snapshot folding the journal being compacted into
+        the current one, and its offset index; returns the index entries
+
+        It is built from the files, not from the objects in memory, so
+        changes not saved yet stay out of it. Only the journal is held
+        in memory; the snapshot is streamed.
+        """
+        changes = OrderedDict()
+        for record, _, _ in self._records(self._path(".journal.old"), 0):
+            if record.get("op") in ("put", "del"):
+                changes.pop(record["key"], None)
+                changes[record["key"]] = record
+
+        token = uuid.uuid4().hex
+        entries = []
+        tmp = self._path(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(json.dumps({"op": "snapshot", "token": token,
+                                "version": self.SNAPSHOT_VERSION})
+                    .encode() + b"\n")
+
+            def write(key, record, line=None):
+                if line is None:
+                    line = json.dumps({"op": "put", "key": key,
+                                       "obj": record}).encode() + b"\n"
+                entries.append([key, f.tell(), len(line),
+                                self._index_values(key, record)])
+                f.write(line)
+
+            for key, record, line in self._snapshot_records():
+                if key not in changes:
+                    write(key, record, line)
+            for key, change in changes.items():
+                if change["op"] == "put":
+                    write(key, change["obj"])
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self._path(".idx.tmp"), "w") as f:
+            json.dump({"token": token, "indexes": self._index_signature(),
+                       "records": entries}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.__file_path)
+        os.replace(self._path(".idx.tmp"), self._path(".idx"))
+        directory = os.open(os.path.dirname(
+            os.path.abspath(self.__file_path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        return entries
+
+    def _snapshot_records(self):
+        """yields (key, object record, line or None) of the current
+        snapshot, in either format"""
+        try:
+            reader = _Reader(self.__file_path, mapped=True)
+        except FileNotFoundError:
+            return
+        header = self._header(reader)
+        if header is None:
+            # the single JSON object written before the journal existed
+            with open(self.__file_path, "r") as f:
+                for key, record in json.load(f).items():
+                    yield key, record, None
+            return
+        for line, _ in reader.lines(header):
+            if line.endswith(b"\n"):
+                record = json.loads(line)
+                yield record["key"], record["obj"], line
+
+    @staticmethod
+    def _header(reader):
+        """the offset of the first record of a snapshot, None if it is in
+        the older single JSON object format"""
+        for line, _ in reader.lines():
+            try:
+                header = json.loads(line)
+            except ValueError:
+                return None
+            if isinstance(header, dict) and header.get("op") == "snapshot":
+                return len(line)
+            return None
+        return 0
+
+    def _index_values(self, key, record):
+        """the indexed field values of a record, as stored in .idx"""
+        cls = classes.get(key.split(".", 1)[0])
+        return {field: record.get(field, getattr(cls, field, None))
+                for fields in self._index_fields(cls) for field in fields}
+
+    def _index_signature(self):
+        """the indexed fields per class, which .idx entries depend on"""
+        return {name: sorted(self._index_values(name + ".", {}))
+                for name in classes}
+
+    @staticmethod
+    def _stamp(path):
+        """identifies one version of a file"""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def reload(self):
+        """locates the records of the snapshot and the journal
+
+        When the snapshot is the one already loaded only the journal
+        records written since the last reload are replayed.
+        """
+        with self.__lock:
+            stamp = self._stamp(self.__file_path)
+            journal = self._path(".journal")
+            inode = (self._stamp(journal) or (None,))[0]
+            applied_stamp, applied_inode, offset = \
+                self.__applied or (False, None, 0)
+            if stamp != applied_stamp or \
+                    applied_inode not in (None, inode):
+                offset = 0
+                stored = [key for keys in self.__by_class.values()
+                          for key in keys]
+                FileStorage.__seen = set()
+                try:
+                    self._load_snapshot()
+                except FileNotFoundError:
+                    pass  # nothing saved yet
+                # left behind by a compaction that did not finish
+                self._replay(self._path(".journal.old"), 0)
+                if inode is not None:
+                    offset = self._replay(journal, offset)
+                seen, FileStorage.__seen = self.__seen, None
+                # deleted by a journal record another process compacted
+                for key in stored:
+                    if key not in seen and key not in self.__pinned:
+                        self._remove(key)
+            elif inode is not None:
+                offset = self._replay(journal, offset)
+            FileStorage.__applied = (stamp, inode, offset)
+
+    def _load_snapshot(self):
+        """locates every record of the snapshot, from its offset index
+        when it is current, or else by reading the records"""
+        reader = _Reader(self.__file_path, mapped=True)
+        start = self._header(reader)
+        if start == 0:
+            return  # empty file
+        if start is None:
+            # the older format has no offsets; build everything now and
+            # rewrite it in the new one
+            with open(self.__file_path, "r") as f:
                 jo = json.load(f)
             for key in jo:
-                self.__objects[key] = classes[jo[key]["__class__"]](**jo[key])
-        except Exception as e:
+                self._refresh(key, None, jo[key])
+            self.compact(wait=False)
+            return
+        header = json.loads(reader.read(0, start))
+        try:
+            with open(self._path(".idx"), "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        if index.get("token") == header["token"] and \
+                index.get("indexes") == self._index_signature():
+            if not self.__by_class:
+                # cold start: take the index as is, and leave filing in
+                # the secondary indexes to the first search of a class
+                for key, offset, length, values in index["records"]:
+                    name = key.split(".", 1)[0]
+                    self.__by_class.setdefault(name, {})[key] = None
+                    self.__located[key] = (reader, offset, length)
+                    self.__pending.setdefault(name, []).append(
+                        (key, values))
+                return
+            for key, offset, length, values in index["records"]:
+                self._refresh(key, (reader, offset, length), values)
+            return
+        for line, offset in reader.lines(start):
+            if line.endswith(b"\n"):
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"{self.__file_path}: unreadable "
+                                     f"record at offset {offset}") from e
+                self._refresh(record["key"], (reader, offset, len(line)),
+                              record["obj"])
+
+    def _refresh(self, key, location, record):
+        """takes in the latest record of key
+
+        An object in use is updated in place, so references held
+        elsewhere stay current, and one with unsaved changes is left
+        alone. record may hold only the indexed fields when location is
+        given.
+        """
+        if self.__seen is not None:
+            self.__seen.add(key)
+        if key in self.__dirty:
+            return
+        current = self.__objects.get(key)
+        if location is None:
+            # no record to load it from later
+            obj = classes[record["__class__"]](**record)
+            name = key.split(".", 1)[0]
+            self._unfile(key, name)
+            self.__by_class.setdefault(name, {})[key] = None
+            self._file(key, name, obj)
+            if current is not None:
+                current.__dict__.update(obj.__dict__)
+                obj = current
+            self.__objects[key] = obj
+            self.__pinned[key] = obj
+            return
+        self._locate(key, location, record)
+        if self.compact_records and key in self.__recent:
+            if "__class__" in record:
+                self.__columns[key.split(".", 1)[0]].put(key, record)
+            else:
+                self._forget(key)
+        if current is not None:
+            if "__class__" not in record:
+                reader, offset, length = location
+                record = json.loads(reader.read(offset, length))["obj"]
+            current.__dict__.update(
+                classes[record["__class__"]](**record).__dict__)
+
+    @staticmethod
+    def _records(path, offset):
+        """yields the complete journal records of path after offset, each
+        with its offset and the offset after it"""
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn by a crash or still being written
+                    start, offset = offset, offset + len(line)
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        record = {"op": "skip"}
+                    yield record, start, offset
+        except FileNotFoundError:
             pass
 
+    def _replay(self, path, offset):
+        """applies the complete journal records of path after offset;
+        returns the offset after the last one"""
+        stamp = self._stamp(path)
+        if stamp is None or stamp[2] <= offset:
+            return offset
+        reader = self.__journal_reader
+        if reader is None or reader.ino != stamp[0]:
+            reader = _Reader(path)
+        for record, start, offset in self._records(path, offset):
+            try:
+                if record["op"] == "put":
+                    self._refresh(record["key"],
+                                  (reader, start, offset - start),
+                                  record["obj"])
+                elif record["op"] == "del" and \
+                        record["key"] not in self.__dirty:
+                    self._remove(record["key"])
+                elif record["op"] == "skip":
+                    raise ValueError("not JSON")
+            except Exception as e:
+                # the records after it still apply
+                print(f"FileStorage: skipped the journal record at "
+                      f"{path}:{start}: {e!r}", file=sys.stderr)
+        return offset
+
     def delete(self, obj=None):
         """delete obj from __objects if it’s inside"""
         if obj is not None:
-            key = obj.__class__.__name__ + '.' + obj.id
-            if key in self.__objects:
-                del self.__objects[key]
+            name = obj.__class__.__name__
+            key = name + '.' + obj.id
+            with self.__lock:
+                if key in self.__by_class.get(name, ()):
+                    self._remove(key)
+                    self.__dirty.discard(key)
+                    self.__deleted.add(key)
 
     def close(self):
         """call reload() method for deserializing the JSON file to objects"""
@@ -104,41 +804,126 @@ class FileStorage:
     def get(self, cls, id):
         """method to retrieve one object Returns the object
         based on the class and its ID, or None if not found"""
-        objs = models.storage.all(cls)
-        for value in objs.values():
-            if value.id == id:
-                return value
-        return None
+        if cls is None or id is None:
+            return None
+        name = cls if isinstance(cls, str) else cls.__name__
+        return self._get(name + "." + id)
 
-    def count(self, cls=None):
+    def get_many(self, cls, ids):
+        """retrieve several objects of a class by ID.
+        Returns a dict keyed by ID; missing IDs are left out"""
+        found = {}
+        for obj_id in ids or []:
+            obj = self.get(cls, obj_id)
+            if obj is not None:
+                found[obj_id] = obj
+        return found
+
+    def count(self, cls=None, attributes=None):
         """method to count the number of objects in storage
         Returns the number of objects in storage matching
-        the given class.
+        the given class and attributes.
         If no class is passed, returns the count of all
         objects in storage"""
-        if cls is not None:
-            objs = models.storage.all(cls).values()
-            count = len(objs)
+        if attributes:
+            count = len(self.search(cls, attributes))
+        elif cls is not None:
+            name = cls if isinstance(cls, str) else cls.__name__
+            count = len(self.__by_class.get(name, {}))
         else:
-            count = 0
-            for cls in classes:
-                objs = models.storage.all(cls).values()
-                count += len(objs)
+            count = sum(len(keys) for keys in self.__by_class.values())
         return count
     
-    def search(self, cls, attributes: dict = {}):
+    def page(self, cls, attributes=None, limit=None, after=None):
+        """ keyset page of cls ordered by (created_at, id)
+
+        after is the (created_at, id) of the last object of the previous
+        page.
+        """
+        objs = self.search(cls, attributes)
+        if after is not None:
+            objs = [obj for obj in objs
+                    if (obj.created_at, obj.id) > tuple(after)]
+        objs.sort(key=lambda obj: (obj.created_at, obj.id))
+        if limit is not None:
+            objs = objs[:limit]
+        return objs
+
+    def search(self, cls, attributes=None, order_by=None, limit=None):
         """ Search all objects with matching attributes
-        
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
-        
-        return list(filter(_search, self.__objects[cls].values()))"""
-        return [
-            obj for obj in self.__objects[cls]
-            if all(obj.get(key) == value for key, value in attributes.items())
-        ]
\ No newline at end of file
+
+        see models.engine.query for the supported lookups.
+        """
+        objs = [obj for obj in self._candidates(cls, attributes)
+                if matches(obj, attributes)]
+        if order_by:
+            sort_objects(objs, order_by)
+        if limit is not None:
+            objs = objs[:limit]
+        return objs
+
+    def _candidates(self, cls, attributes):
+        """the objects of cls that can match attributes: those of the
+        best index covering its equality lookups, else all of them"""
+        name = cls if isinstance(cls, str) else cls.__name__
+        equal = {}
+        for key, value in (attributes or {}).items():
+            field, op = split_lookup(key)
+            if op == "eq":
+                equal[field] = value
+        if isinstance(equal.get("id"), str):
+            keys = [name + "." + equal["id"]]
+        else:
+            # filing and saves change the buckets; copy them in the lock
+            with self.__lock:
+                keys = self.__by_class.get(name, {})
+                self._ensure_filed(name)
+                indexes = self.__indexes.get(name, {})
+                covering = [fields for fields in indexes
+                            if all(field in equal for field in fields)]
+                if covering:
+                    fields = max(covering, key=len)
+                    try:
+                        keys = indexes[fields].get(
+                            tuple(equal[field] for field in fields), {})
+                    except TypeError:
+                        pass
+                keys = list(keys)
+        objs = [self._get(key) for key in keys]
+        return [obj for obj in objs if obj is not None]
+
+    def index_stats(self):
+        """size of every class dict and index, with an estimate of the
+        memory they take, and how many objects are loaded, kept as
+        recently used and held with unsaved changes"""
+        stats = {}
+        with self.__lock:
+            for name, objects in self.__by_class.items():
+                self._ensure_filed(name)
+                overhead = sys.getsizeof(objects)
+                indexes = {}
+                for fields, buckets in self.__indexes.get(name, {}).items():
+                    size = sys.getsizeof(buckets) + sum(
+                        sys.getsizeof(values) + sys.getsizeof(bucket)
+                        for values, bucket in buckets.items())
+                    overhead += size
+                    indexes[",".join(fields)] = {
+                        "distinct": len(buckets),
+                        "bytes": size,
+                    }
+                overhead += sum(sys.getsizeof(self.__indexed[key])
+                                for key in objects if key in self.__indexed)
+                stats[name] = {
+                    "objects": len(objects),
+                    "loaded": sum(1 for key in list(self.__objects.keys())
+                                  if key in objects),
+                    "cached": sum(1 for key in self.__recent
+                                  if key in objects),
+                    "unsaved": sum(1 for key in self.__pinned
+                                   if key in objects),
+                    "columns_bytes": self.__columns[name].nbytes()
+                    if name in self.__columns else 0,
+                    "indexes": indexes,
+                    "overhead_bytes": overhead,
+                }
+        return stats
@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+"""
+Filter helpers shared by the storage engines
+
+A filter is a dict of ``{"<field>[__<op>]": value}`` entries, all of which
+must match. Supported operators:
+
+    eq (default), ne, in, lt, lte, gt, gte
+
+Ordering is a field name, or a list of them, with a leading ``-`` for
+descending order, e.g. ``["-created_at", "id"]``.
+"""
+
+OPERATORS = ("eq", "ne", "in", "lt", "lte", "gt", "gte")
+
+
+def split_lookup(key):
+    """splits a filter key into (field, operator)"""
+    field, sep, op = key.rpartition("__")
+    if sep and op in OPERATORS:
+        return field, op
+    return key, "eq"
+
+
+def split_order(order_by):
+    """normalizes order_by into a list of (field, descending) pairs"""
+    if order_by is None:
+        return []
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    pairs = []
+    for field in order_by:
+        if field.startswith("-"):
+            pairs.append((field[1:], True))
+        else:
+            pairs.append((field, False))
+    return pairs
+
+
+def compare(value, op, expected):
+    """evaluates one lookup against a value the way SQL would"""
+    if op == "eq":
+        return value == expected
+    if op == "ne":
+        return value != expected
+    if op == "in":
+        return value in expected
+    if value is None or expected is None:
+        return False
+    if op == "lt":
+        return value < expected
+    if op == "lte":
+        return value <= expected
+    if op == "gt":
+        return value > expected
+    return value >= expected
+
+
+def matches(obj, attributes):
+    """returns True if obj satisfies every filter in attributes"""
+    for key, expected in (attributes or {}).items():
+        field, op = split_lookup(key)
+        if not compare(getattr(obj, field, None), op, expected):
+            return False
+    return True
+
+
+def sort_objects(objs, order_by):
+    """sorts objs in place by order_by, NULLs first like MySQL"""
+    for field, descending in reversed(split_order(order_by)):
+        objs.sort(key=lambda obj: (getattr(obj, field, None) is not None,
+                                   getattr(obj, field, None)),
+                  reverse=descending)
+    return objs
@@ -2,13 +2,16 @@
 """ holds class Event"""
 from models import storage_t
 from models.base_model import BaseModel, Base
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Index
 
 
 class Event(BaseModel, Base):
     """Representation of a Event """
     if storage_t == 'db':
         __tablename__ = 'events'
+        __table_args__ = (
+            Index('ix_events_created', 'created_at', 'id'),
+        )
         level_id = Column(String(128), ForeignKey('levels.id'), nullable=False)
         title = Column(String(255), nullable=False)
         date = Column(DateTime, nullable=False)
@@ -2,7 +2,7 @@
 """ holds class Level"""
 from models import storage_t
 from models.base_model import BaseModel, Base
-from sqlalchemy import Column, String
+from sqlalchemy import Column, String, Index
 from sqlalchemy.orm import relationship
 
 
@@ -11,6 +11,9 @@ class Level(BaseModel, Base):
     """Representation of a level """
     if storage_t == 'db':
         __tablename__ = 'levels'
+        __table_args__ = (
+            Index('ix_levels_created', 'created_at', 'id'),
+        )
         name = Column(String(128), nullable=False)
         academic_year = Column(String(128), nullable=False)
         semester = Column(String(128), nullable=False)
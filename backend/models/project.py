@@ -2,7 +2,7 @@
 """ holds class Course"""
 from models import storage_t
 from models.base_model import BaseModel, Base
-from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey, Float, Boolean
+from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey, Float, Boolean, Index
 from sqlalchemy.orm import relationship
 
 
@@ -10,6 +10,9 @@ class Project(BaseModel, Base):
     """Representation of a Project """
     if storage_t == 'db':
         __tablename__ = 'projects'
+        __table_args__ = (
+            Index('ix_projects_created', 'created_at', 'id'),
+        )
         course_id = Column(String(128), ForeignKey('courses.id', ondelete='CASCADE'), nullable=False)
         name = Column(String(255), nullable=False)
         description = Column(Text, nullable=False)
@@ -22,6 +25,8 @@ class Project(BaseModel, Base):
         resources = relationship("Resource", backref="projects", cascade='all, delete')
         submissions = relationship("Submission", backref="projects", cascade='all, delete')
     else:
+        # hash indexes FileStorage keeps for equality search
+        __indexes__ = ("course_id",)
         course_id = ""
         name = ""
         description = ""
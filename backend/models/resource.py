@@ -14,6 +14,8 @@ class Resource(BaseModel, Base):
         type = Column(String(50), nullable=False)
         url = Column(Text, nullable=False)
     else:
+        # hash indexes FileStorage keeps for equality search
+        __indexes__ = ("project_id",)
         project_id = ""
         title = ""
         type = ""
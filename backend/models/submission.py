@@ -2,7 +2,7 @@
 """ holds class Submission"""
 from models import storage_t
 from models.base_model import BaseModel, Base
-from sqlalchemy import Column, String, ForeignKey, Text, Integer
+from sqlalchemy import Column, String, ForeignKey, Text, Integer, Index
 from sqlalchemy.orm import relationship
 
 
@@ -10,6 +10,10 @@ class Submission(BaseModel, Base):
     """Representation of a submission """
     if storage_t == 'db':
         __tablename__ = 'submissions'
+        __table_args__ = (
+            Index('ix_submissions_student_project_task',
+                  'student_id', 'project_id', 'task_id'),
+        )
         student_id = Column(String(128), ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
         task_id = Column(String(128), ForeignKey('tasks.id', ondelete='CASCADE'), nullable=False)
         project_id = Column(String(128), ForeignKey('projects.id', ondelete='CASCADE'), nullable=False)
@@ -20,6 +24,8 @@ class Submission(BaseModel, Base):
         score = Column(Integer)
         test_results = relationship("TestResult", backref="submissions", cascade='all, delete')
     else:
+        # hash indexes FileStorage keeps for equality search
+        __indexes__ = (("student_id", "task_id"), ("student_id", "project_id"))
         student_id = ""
         task_id = ""
         project_id = ""
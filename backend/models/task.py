@@ -24,6 +24,8 @@ class Task(BaseModel, Base):
         test_cases = relationship("TestCase", backref="tasks", cascade='all, delete')
         submissions = relationship("Submission", backref="tasks", cascade='all, delete')
     else:
+        # hash indexes FileStorage keeps for equality search
+        __indexes__ = ("project_id",)
         project_id = ""
         name = ""
         description = ""
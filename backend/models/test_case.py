@@ -2,7 +2,7 @@
 """ holds class Submission"""
 from models import storage_t
 from models.base_model import BaseModel, Base
-from sqlalchemy import Column, String, ForeignKey, Text, Integer
+from sqlalchemy import Column, String, ForeignKey, Text, Integer, Index
 from sqlalchemy.orm import relationship
 
 
@@ -10,6 +10,9 @@ class TestCase(BaseModel, Base):
     """Representation of a submission """
     if storage_t == 'db':
         __tablename__ = 'test_cases'
+        __table_args__ = (
+            Index('ix_test_cases_task_order', 'task_id', 'order_index'),
+        )
         task_id = Column(String(128), ForeignKey('tasks.id', ondelete='CASCADE'), nullable=False)
         name = Column(String(255), nullable=False)
         input = Column(Text, nullable=False)
@@ -18,6 +21,8 @@ class TestCase(BaseModel, Base):
         order_index = Column(String(50), nullable=False)
         test_result = relationship("TestResult", backref="test_cases", cascade='all, delete')
     else:
+        # hash indexes FileStorage keeps for equality search
+        __indexes__ = ("task_id",)
         name = ""
         input = ""
         expected = ""
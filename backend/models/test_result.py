@@ -2,13 +2,18 @@
 """ holds class test result"""
 from models import storage_t
 from models.base_model import BaseModel, Base
-from sqlalchemy import Column, String, ForeignKey, Text, Boolean
+from sqlalchemy import Column, String, ForeignKey, Text, Boolean, Index
 
 
 class TestResult(BaseModel, Base):
     """Representation of a testresult """
     if storage_t == 'db':
         __tablename__ = 'test_results'
+        __table_args__ = (
+            Index('ix_test_results_submission_task',
+                  'submission_id', 'task_id'),
+            Index('ix_test_results_task', 'task_id'),
+        )
         submission_id = Column(String(128), ForeignKey('submissions.id', ondelete='CASCADE'), nullable=False)
         task_id = Column(String(128), ForeignKey('tasks.id', ondelete='CASCADE'), nullable=False)
         test_case_id = Column(String(128), ForeignKey('test_cases.id', ondelete='CASCADE'), nullable=False)
@@ -17,6 +22,8 @@ class TestResult(BaseModel, Base):
         actual_output = Column(Text, nullable=True)
         passed = Column(Boolean, default=False)
     else:
+        # hash indexes FileStorage keeps for equality search
+        __indexes__ = ("submission_id", "task_id")
         name = ""
         status = ""
         actual_output = ""
@@ -2,13 +2,16 @@
 """ holds class Event"""
 from models import storage_t
 from models.base_model import BaseModel, Base
-from sqlalchemy import Column, String, Text, DateTime, Integer, ForeignKey
+from sqlalchemy import Column, String, Text, DateTime, Integer, ForeignKey, Index
 
 
 class Timetable(BaseModel, Base):
     """Representation of a Timetable """
     if storage_t == 'db':
         __tablename__ = 'timetables'
+        __table_args__ = (
+            Index('ix_timetables_created', 'created_at', 'id'),
+        )
         level_id = Column(String(128), ForeignKey('levels.id'), nullable=False)
         course_name = Column(String(255), nullable=False)
         day = Column(Integer, nullable=False)
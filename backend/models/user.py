@@ -4,7 +4,7 @@ import hashlib
 from datetime import datetime
 from models import storage_t
 from models.base_model import BaseModel, Base
-from sqlalchemy import Column, String, Integer, ForeignKey, DateTime, Enum, CheckConstraint
+from sqlalchemy import Column, String, Integer, ForeignKey, DateTime, Enum, CheckConstraint, Index
 from sqlalchemy.orm import relationship
 
 
@@ -13,6 +13,10 @@ class User(BaseModel, Base):
     """Representation of a user """
     if storage_t == 'db':
         __tablename__ = 'users'
+        __table_args__ = (
+            Index('ix_users_email', 'email'),
+            Index('ix_users_created', 'created_at', 'id'),
+        )
         title = Column(String(128), nullable=True)
         email = Column(String(128), nullable=False)
         _password = Column(String(128), nullable=False)
@@ -30,6 +34,8 @@ class User(BaseModel, Base):
         
         #task_result = relationship("TaskResult", backref="users")
     else:
+        # hash indexes FileStorage keeps for equality search
+        __indexes__ = ("email",)
         title = ""
         email = ""
         _password = ""
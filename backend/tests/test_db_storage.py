@@ -0,0 +1,42 @@
+#!/usr/bin/python3
+"""Tests for DBStorage against an in-memory SQLite database"""
+import unittest
+
+from sqlalchemy import create_engine
+
+import models
+
+if models.storage_t == "db":
+    from models.engine.db_storage import DBStorage
+    from models.level import Level
+
+
+@unittest.skipUnless(models.storage_t == "db", "models are not in db mode")
+class TestCount(unittest.TestCase):
+    """DBStorage.count"""
+
+    def setUp(self):
+        self.storage = DBStorage.__new__(DBStorage)
+        self.storage._DBStorage__engine = create_engine("sqlite://")
+        self.storage.reload()
+        for i in range(5):
+            self.storage.new(Level(name=f"L{i}", academic_year="2024",
+                                   semester="first" if i < 2 else "second"))
+        self.storage.save()
+
+    def tearDown(self):
+        self.storage.close()
+
+    def test_unfiltered(self):
+        self.assertEqual(self.storage.count(Level), 5)
+        self.assertEqual(self.storage.count("Level"), 5)
+
+    def test_filtered(self):
+        self.assertEqual(self.storage.count(Level, {"semester": "first"}), 2)
+        self.assertEqual(self.storage.count(Level, {"name__in": ["L0", "L4"]}),
+                         2)
+        self.assertEqual(self.storage.count(Level, {"name": "none"}), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
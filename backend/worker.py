@@ -1,16 +1,62 @@
 """Simple RQ worker runner for DevArena.
 
-Run this with: python3 backend/worker.py
+Run this with: python3 backend/worker.py [--languages python,c]
+                                         [--priorities exam,normal,bulk]
 or use `rq worker` directly after installing RQ.
+
+Jobs run in this process (SimpleWorker) rather than in a forked child per
+job, so the warm sandbox pool started here is reused across jobs.
+
+The worker listens on the grading queue of every language and priority
+it is given (see api.v1.tasks.queues) and picks the next job in
+weighted priority order, drawn again after every job.
 """
-from redis import StrictRedis
-from rq import Worker, Queue, Connection
+import argparse
+
+from rq import SimpleWorker, Queue, Connection
+
+from api.v1.caching.connection import get_blocking_redis
+from api.v1.tasks.grader import LANGUAGES
+from api.v1.tasks.queues import PRIORITIES, queue_names, record_wait, \
+    weighted_order
+from api.v1.tasks.sandbox import get_pool
+
+# BLPOP waits for jobs for minutes, longer than the request-path pool's
+# reply timeout allows
+redis_conn = get_blocking_redis()
 
-listen = ['grading']
 
-redis_conn = StrictRedis(host='localhost', port=6379, decode_responses=True)
+class WeightedWorker(SimpleWorker):
+    """SimpleWorker taking jobs from its queues in weighted priority
+    order."""
+
+    def reorder_queues(self, reference_queue):
+        """Draw a new queue order after every job."""
+        self._ordered_queues = weighted_order(self.queues)
+
+    def execute_job(self, job, queue):
+        """Record how long job waited, then run it."""
+        try:
+            record_wait(self.connection, queue, job)
+        except Exception as e:
+            print("Failed to record queue wait:", str(e))
+        super().execute_job(job, queue)
+
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="DevArena grading worker")
+    parser.add_argument('--languages',
+                        default=','.join(name.lower() for name in LANGUAGES),
+                        help="comma separated languages to grade")
+    parser.add_argument('--priorities', default=','.join(PRIORITIES),
+                        help="comma separated priorities to take")
+    args = parser.parse_args()
+    languages = [name for name in args.languages.split(',') if name]
+    priorities = [name for name in args.priorities.split(',') if name]
+    listen = queue_names(languages, priorities)
+
+    get_pool().warm(spec['image'] for name, spec in LANGUAGES.items()
+                    if name.lower() in languages)
     with Connection(redis_conn):
-        worker = Worker(list(map(Queue, listen)))
+        worker = WeightedWorker(list(map(Queue, listen)))
         worker.work()